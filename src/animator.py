@@ -2,20 +2,50 @@
 
 import time
 
+from output_stage import OutputStage
+
 class Animator():
-    def __init__(self, fps):
+    def __init__(self, fps, output_stage=None, stats=None, clock=None):
         self._last_anim_exec = time.time()
         self._anim_target = None
         self._pixel_target = None
         self._loop_time = 1 / fps
+        self._output_stage = output_stage if output_stage else OutputStage()
+        self._stats = stats
+        self._clock = clock
+        self._slack = 0.0
+        self._presentation_time = None
+        self._presentation_epoch_ns = None
 
-    def animate(self):
+    def animate(self, delta_t=None, timestamp_ns=None):
         start_time = time.time()
+        if delta_t is None:
+            delta_t = start_time - self._last_anim_exec
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
         if self._anim_target:
-            pixel_bytes = self._anim_target.animate_base(start_time - self._last_anim_exec)
+            effect_name = type(self._anim_target).__name__
+            animate_start = time.perf_counter()
+            frame = self._anim_target.animate_base(delta_t)
+            output_start = time.perf_counter()
+            self._output_stage.set_fade(self._anim_target.fade_level())
+            frame = self._output_stage.apply(frame)
+            frame.set_timestamp(timestamp_ns)
+            frame.set_effect(effect_name)
+            send_start = time.perf_counter()
             if self._pixel_target:
-                self._pixel_target.send_frame(pixel_bytes)
+                self._pixel_target.send_frame(frame)
+            send_stop = time.perf_counter()
+
+            if self._stats:
+                self._stats.record_frame(effect_name, {
+                    'animate': output_start - animate_start,
+                    'output': send_start - output_start,
+                    'send': send_stop - send_start,
+                    'slack': self._slack,
+                })
         self._last_anim_exec = start_time
+        return delta_t
 
     def set_animator_target(self, target):
         self._anim_target = target
@@ -23,14 +53,38 @@ class Animator():
     def set_pixel_target(self, target):
         self._pixel_target = target
 
+    def output_stage(self):
+        return self._output_stage
+
+    def stats(self):
+        return self._stats
+
     def run(self):
+        if self._clock:
+            return self._run_clocked()
+
         # Fist check how long we need to sleep to maintain framerate
         stop_time = time.time()
         delta_t = stop_time - self._last_anim_exec
         sleep_time = self._loop_time - delta_t
+        self._slack = sleep_time
         if sleep_time > 0:
             time.sleep(sleep_time)
 
         # Start the next animation run
-        self.animate()
+        return self.animate()
+
+    def _run_clocked(self):
+        # Effects advance by presentation time so motion stays even when frames run late
+        presentation_time, self._slack = self._clock.wait()
+        if self._presentation_time is None:
+            delta_t = 0.0
+        else:
+            delta_t = presentation_time - self._presentation_time
+        self._presentation_time = presentation_time
 
+        # Pin the clock's timeline to the wall clock once so frame timestamps stay evenly spaced
+        presentation_ns = int(presentation_time * 1e9)
+        if self._presentation_epoch_ns is None:
+            self._presentation_epoch_ns = time.time_ns() - presentation_ns
+        return self.animate(delta_t, self._presentation_epoch_ns + presentation_ns)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import threading
+import time
+
+from client import PROTOCOL_FRAMED, PROTOCOL_RAW, RAW_ACK_SIZE
+from frame import Frame, frame_buffer
+from frame_protocol import ACK, FrameHeader
+
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+class AsyncClient():
+    def __init__(self, ip=None, port=None, protocol=None):
+        self._ip = ip if ip else os.environ['PIXEL_TARGET_IP']
+        self._port = int(port if port else os.environ['PIXEL_TARGET_PORT'])
+        self._protocol = protocol if protocol else os.getenv('PIXEL_TARGET_PROTOCOL', PROTOCOL_RAW)
+        self._ack_size = ACK.size if self._protocol == PROTOCOL_FRAMED else RAW_ACK_SIZE
+        self._sequence = 0
+
+        # One slot mailbox, a frame that has not gone out yet is replaced by the next one
+        self._lock = threading.Lock()
+        self._pending = None
+        self._spare = None
+        self._sent_frames = 0
+        self._dropped_frames = 0
+        self._reconnects = 0
+        self._connected = False
+        self._closing = False
+
+        self._loop = asyncio.new_event_loop()
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def send_frame(self, frame):
+        # Copies the frame into the mailbox and returns straight away, never touches the socket
+        data = frame_buffer(frame)
+        timestamp_ns = frame.timestamp() if isinstance(frame, Frame) else time.time_ns()
+        with self._lock:
+            slot = self._spare if self._spare is not None and len(self._spare) == len(data) else bytearray(len(data))
+            self._spare = None
+            slot[:] = data
+            if self._pending is not None:
+                self._dropped_frames += 1
+                self._spare = self._pending[0]
+            self._pending = (slot, timestamp_ns)
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return len(data)
+
+    def close(self):
+        # Cancel rather than wake the loop, it may be in a backoff sleep, a connect or a stalled drain
+        self._closing = True
+        self._loop.call_soon_threadsafe(self._cancel)
+        self._thread.join()
+
+    def is_connected(self):
+        return self._connected
+
+    def sent_frames(self):
+        return self._sent_frames
+
+    def dropped_frames(self):
+        return self._dropped_frames
+
+    def reconnects(self):
+        return self._reconnects
+
+    def _take_pending(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = None
+        return pending
+
+    def _release(self, slot):
+        with self._lock:
+            if self._spare is None:
+                self._spare = slot
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self._run())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        self._loop.close()
+
+    async def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while not self._closing:
+            try:
+                reader, writer = await asyncio.open_connection(self._ip, self._port)
+            except OSError as error:
+                print("Connecting to {}:{} failed ({}), retrying in {}s".format(self._ip, self._port, error, delay))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            delay = RECONNECT_MIN_DELAY
+            self._connected = True
+            try:
+                await self._send_loop(reader, writer)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError) as error:
+                print("Lost connection to {}:{} ({})".format(self._ip, self._port, error))
+                self._reconnects += 1
+            finally:
+                self._connected = False
+                writer.close()
+
+    async def _send_loop(self, reader, writer):
+        ack_task = asyncio.ensure_future(self._drain_acks(reader))
+        wakeup_task = None
+        try:
+            while not self._closing:
+                wakeup_task = asyncio.ensure_future(self._wakeup.wait())
+                done, _ = await asyncio.wait({wakeup_task, ack_task}, return_when=asyncio.FIRST_COMPLETED)
+                if ack_task in done:
+                    wakeup_task.cancel()
+                    ack_task.result()
+                self._wakeup.clear()
+
+                pending = self._take_pending()
+                if pending is None:
+                    continue
+                slot, timestamp_ns = pending
+                if self._protocol == PROTOCOL_FRAMED:
+                    header = FrameHeader(self._sequence, 0, len(slot) // 3, len(slot), timestamp_ns)
+                    writer.write(header.pack())
+                    self._sequence += 1
+                writer.write(slot)
+                await writer.drain()
+                self._release(slot)
+                self._sent_frames += 1
+        finally:
+            # Let the helper tasks finish cancelling so none is left pending when close() stops the loop
+            tasks = [task for task in (ack_task, wakeup_task) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _drain_acks(self, reader):
+        # Acks only matter for flow control in the blocking client, here they are just consumed
+        while True:
+            await reader.readexactly(self._ack_size)
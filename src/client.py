@@ -3,34 +3,78 @@
 import os
 import socket
 import time
+from collections import deque
+
+from frame import Frame, frame_buffer
+from frame_protocol import ACK, DEFAULT_KEYFRAME_INTERVAL, HEADER, SEQUENCE_MASK, DeltaEncoder, FrameHeader, send_buffers, unpack_ack
+
+PROTOCOL_RAW = 'raw'
+PROTOCOL_FRAMED = 'framed'
+RAW_ACK_SIZE = 4
+RTT_SMOOTHING = 0.125
 
 
 class Client():
-    def __init__(self, ip, port, wait_for_rx=True):
-        self._ip = ip
-        self._port = port
+    def __init__(self, wait_for_rx=True, ip=None, port=None, protocol=None, delta=None,
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, window=None):
+        self._ip = ip if ip else os.environ['PIXEL_TARGET_IP']
+        self._port = int(port if port else os.environ['PIXEL_TARGET_PORT'])
         self._wait_for_rx = wait_for_rx
-        self._connect()
 
-    def __init__(self, wait_for_rx=True):
-        self._ip = os.environ['PIXEL_TARGET_IP']
-        self._port = int(os.environ['PIXEL_TARGET_PORT'])
-        self._wait_for_rx = wait_for_rx
+        # Raw frames are all the C++ server understands, so framing is opt in
+        self._protocol = protocol if protocol else os.getenv('PIXEL_TARGET_PROTOCOL', PROTOCOL_RAW)
+        self._sequence = 0
+
+        # Delta frames need the framed protocol to flag them
+        if delta is None:
+            delta = os.getenv('PIXEL_TARGET_DELTA', '0') == '1'
+        self._delta_encoder = DeltaEncoder(keyframe_interval) if delta else None
+        self._bytes_sent = 0
+        self._full_frame_bytes = 0
+
+        # A window allows that many unacknowledged frames in flight instead of stop and wait
+        if window is None:
+            window = int(os.getenv('PIXEL_TARGET_WINDOW', '0'))
+        self._window = window
+        self._in_flight = deque()
+        self._ack_buffer = bytearray()
+        self._ack_size = ACK.size if self._protocol == PROTOCOL_FRAMED else RAW_ACK_SIZE
+        self._rtt = None
+        self._last_rtt = None
+        self._playout_delay_ns = 0
+        self._blocked_time = 0.0
         self._connect()
 
     def __del__(self):
         self._socket.close()
 
-    def send_frame(self, frame, wait_for_rx=True):
+    def send_frame(self, frame, wait_for_rx=True, sequence=None):
+        # A shared sequence lets several clients number the parts of one frame alike
+        if sequence is not None:
+            self._sequence = sequence
+        if self._window:
+            self._wait_for_window()
+
         send_start = time.time()
-        sent = self._socket.sendall(frame)
+        sequence = self._sequence
+        if self._protocol == PROTOCOL_FRAMED:
+            sent = self._send_framed(frame)
+        else:
+            sent = self._socket.sendall(frame_buffer(frame))
+            self._sequence += 1
         send_stop = time.time()
 
         if (send_stop - send_start) > 0.010:
             print("Send blocked for: {}s".format(send_stop - send_start))
 
-        if self._wait_for_rx:
-            self._socket.recv(4)
+        if self._window:
+            self._in_flight.append((sequence, time.monotonic()))
+            self._read_acks(False)
+        elif self._wait_for_rx:
+            if self._protocol == PROTOCOL_FRAMED:
+                unpack_ack(self._recv_exact(ACK.size))
+            else:
+                self._socket.recv(4)
         else:
             try:
                 self._socket.recv(1024, socket.MSG_DONTWAIT)
@@ -38,6 +82,100 @@ class Client():
                 pass
         return sent
 
+    def address(self):
+        return (self._ip, self._port)
+
+    def bytes_sent(self):
+        return self._bytes_sent
+
+    def full_frame_bytes(self):
+        # What the framed stream would have cost without delta encoding
+        return self._full_frame_bytes
+
+    def in_flight(self):
+        return len(self._in_flight)
+
+    def rtt(self):
+        # Smoothed round trip time in seconds, None until the first ack
+        return self._rtt
+
+    def last_rtt(self):
+        return self._last_rtt
+
+    def set_playout_delay(self, seconds):
+        # Asks the server to show frames this much later than it otherwise would, framed protocol only
+        self._playout_delay_ns = max(int(seconds * 1e9), 0)
+
+    def blocked_time(self):
+        # Total time spent waiting on a full window
+        return self._blocked_time
+
+    def _wait_for_window(self):
+        wait_start = time.monotonic()
+        while len(self._in_flight) >= self._window:
+            self._read_acks(True)
+        self._blocked_time += time.monotonic() - wait_start
+
+    def _read_acks(self, block):
+        try:
+            rx = self._socket.recv(1024, 0 if block else socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return
+        if not rx:
+            raise ConnectionError("Pixel server closed the connection")
+        self._ack_buffer.extend(rx)
+
+        ack_time = time.monotonic()
+        while len(self._ack_buffer) >= self._ack_size:
+            ack = self._ack_buffer[:self._ack_size]
+            del self._ack_buffer[:self._ack_size]
+            if self._protocol == PROTOCOL_FRAMED:
+                self._ack_frames(unpack_ack(ack), ack_time)
+            elif self._in_flight:
+                self._ack_frames(self._in_flight[0][0] & SEQUENCE_MASK, ack_time)
+
+    def _ack_frames(self, acked_sequence, ack_time):
+        # Acks are cumulative, anything sent before the acked frame is settled too
+        sent_time = None
+        while self._in_flight and ((acked_sequence - self._in_flight[0][0]) & SEQUENCE_MASK) < SEQUENCE_MASK // 2:
+            sequence, sent_time = self._in_flight.popleft()
+        if sent_time is None:
+            return
+
+        self._last_rtt = ack_time - sent_time
+        if self._rtt is None:
+            self._rtt = self._last_rtt
+        else:
+            self._rtt += RTT_SMOOTHING * (self._last_rtt - self._rtt)
+
+    def _send_framed(self, frame):
+        payload = frame_buffer(frame)
+        pixel_count = len(payload) // 3
+        flags = 0
+        if isinstance(frame, Frame):
+            timestamp_ns = frame.timestamp()
+            if self._delta_encoder:
+                flags, payload = self._delta_encoder.encode(frame.pixels())
+        else:
+            timestamp_ns = time.time_ns()
+
+        header = FrameHeader(self._sequence, 0, pixel_count, len(payload), timestamp_ns, flags=flags,
+                             playout_delay_ns=self._playout_delay_ns)
+        send_buffers(self._socket, [header.pack(), payload])
+        self._sequence += 1
+        self._bytes_sent += HEADER.size + len(payload)
+        self._full_frame_bytes += HEADER.size + pixel_count * 3
+        return len(payload)
+
+    def _recv_exact(self, byte_count):
+        data = bytearray()
+        while len(data) < byte_count:
+            rx = self._socket.recv(byte_count - len(data))
+            if not rx:
+                raise ConnectionError("Pixel server closed the connection")
+            data.extend(rx)
+        return data
+
     def _connect(self):
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._socket.connect((self._ip, self._port))
@@ -45,4 +183,3 @@ class Client():
             self._socket.setblocking(True)
             self._socket.settimeout(None)
 
-
@@ -2,27 +2,63 @@
 
 import importlib
 import os
+import signal
 import sys
-import time
 from glob import glob
 from random import random, choice
 
 from animator import Animator
+from async_client import AsyncClient
 from client import Client
+from dmx_client import ArtNetClient, E131Client
+from fanout_client import FanOutClient
+from frame_clock import FrameClock, LATE_SKIP
+from frame_stats import FrameStats
+from output_stage import OutputStage
+from recorder import FrameRecorder
+from shm_client import ShmClient
 from sim_client import SimClient
 from utils import PixelMap
 
-TARGET_FPS = 30
+TARGET_FPS = float(os.getenv('PIXEL_TARGET_FPS', '30'))
 MIN_EFFECT_TIME = 30
 MAX_EFFECT_TIME = 300
 FADE_EFFECT_TIME = 5
 
+def sigterm_handler(signum, frame):
+    # Process managers stop a run with SIGTERM, exiting through SystemExit lets main close the sink
+    sys.exit(0)
+
+def load_effect_classes():
+    effect_classes = {}
+    effects_path = os.path.join(os.path.dirname(__file__), 'effects')
+    effect_sources = glob(os.path.join(effects_path, '*.py'))
+    for effect_source in effect_sources:
+        effect_module = os.path.basename(effect_source).rstrip('.py')
+        effect_name = effect_module.title().replace('_', '') + 'Effect'
+        if effect_name == "InitEffect":
+            continue
+
+        print('Loading effect: {}'.format(effect_name))
+        effect_module_import = importlib.import_module('.{}'.format(effect_module), 'effects')
+        if hasattr(effect_module_import, effect_name):
+            effect_classes[effect_name] = getattr(effect_module_import, effect_name)
+        else:
+            print("Ignoring effect due to errors: {}.py".format(effect_module))
+    return effect_classes
+
+
 class Coordinator():
     def __init__(self, pixel_sink, pixel_map):
         self._pixel_sink = pixel_sink
         self._pixel_map = pixel_map
         self._effect_pool = {}
-        self._animator = Animator(TARGET_FPS)
+        self._animator = Animator(
+            TARGET_FPS,
+            OutputStage.from_env(),
+            FrameStats.from_env(1 / TARGET_FPS),
+            FrameClock(TARGET_FPS, os.getenv('PIXEL_LATE_POLICY', LATE_SKIP)),
+        )
         self._effect_timer = 0
         self._current_effect = None
         self._last_effect = None
@@ -31,28 +67,16 @@ class Coordinator():
 
         self._animator.set_pixel_target(self._pixel_sink)
 
+    def stats(self):
+        return self._animator.stats()
+
     def load_effects(self):
-        effects_path = os.path.join(os.path.dirname(__file__), 'effects')
-        effect_sources = glob(os.path.join(effects_path, '*.py'))
-        for effect_source in effect_sources:
-            effect_module = os.path.basename(effect_source).rstrip('.py')
-            effect_name = effect_module.title().replace('_', '') + 'Effect'
-            if effect_name == "InitEffect":
-                continue
-
-            print('Loading effect: {}'.format(effect_name))
-            effect_module_import = importlib.import_module('.{}'.format(effect_module), 'effects')
-            if hasattr(effect_module_import, effect_name):
-                self._effect_pool[effect_name] = getattr(effect_module_import, effect_name)(self._pixel_map)
-            else:
-                print("Ignoring effect due to errors: {}.py".format(effect_module))
+        for effect_name, effect_class in load_effect_classes().items():
+            self._effect_pool[effect_name] = effect_class(self._pixel_map)
 
     def run(self):
         while True:
-            start_time = time.time()
-            self._animator.run()
-            stop_time = time.time()
-            delta_t = stop_time - start_time
+            delta_t = self._animator.run()
             self._effect_timer -= delta_t
 
             if self._effect_timer < FADE_EFFECT_TIME and self._current_effect:
@@ -76,6 +100,18 @@ class Coordinator():
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == 'sim':
         pixel_server = SimClient('./tree_sim.sock')
+    elif len(sys.argv) > 1 and sys.argv[1] == 'shm':
+        pixel_server = ShmClient()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'async':
+        pixel_server = AsyncClient()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'sacn':
+        pixel_server = E131Client.from_env()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'artnet':
+        pixel_server = ArtNetClient.from_env()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'fanout':
+        pixel_server = FanOutClient.from_env()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'record':
+        pixel_server = FrameRecorder(sys.argv[2] if len(sys.argv) > 2 else os.getenv('PIXEL_RECORD_PATH', 'frames.pxr'))
     else:
         pixel_server = Client(False)
 
@@ -83,7 +119,13 @@ def main():
 
     coordinator = Coordinator(pixel_server, pixel_map)
 
-    coordinator.run()
+    signal.signal(signal.SIGTERM, sigterm_handler)
+    try:
+        coordinator.run()
+    finally:
+        # Sinks that buffer or own shared resources flush and clean up here
+        if hasattr(pixel_server, 'close'):
+            pixel_server.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+from coordinator import load_effect_classes
+from frame_protocol import DEFAULT_KEYFRAME_INTERVAL, HEADER, DeltaEncoder
+from utils import PixelMap
+
+BENCH_FPS = 30
+BENCH_SECONDS = 60
+
+
+def bench_effect(effect, frame_count, delta_t):
+    # Returns the framed stream size with and without delta encoding
+    encoder = DeltaEncoder(DEFAULT_KEYFRAME_INTERVAL)
+    full_bytes = 0
+    delta_bytes = 0
+    for _ in range(frame_count):
+        frame = effect.animate_base(delta_t)
+        flags, payload = encoder.encode(frame.pixels())
+        full_bytes += HEADER.size + frame.byte_count()
+        delta_bytes += HEADER.size + len(payload)
+    return (full_bytes, delta_bytes)
+
+
+def main():
+    pixel_map_csv = sys.argv[1] if len(sys.argv) > 1 else os.getenv('PIXEL_MAP_CSV')
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else BENCH_SECONDS
+    pixel_map = PixelMap.from_csv(pixel_map_csv)
+    frame_count = int(seconds * BENCH_FPS)
+
+    results = []
+    for effect_name, effect_class in sorted(load_effect_classes().items()):
+        full_bytes, delta_bytes = bench_effect(effect_class(pixel_map), frame_count, 1 / BENCH_FPS)
+        results.append((effect_name, full_bytes, delta_bytes))
+
+    print("{} frames per effect at {} fps, keyframe every {} frames".format(frame_count, BENCH_FPS, DEFAULT_KEYFRAME_INTERVAL))
+    print("{:<28} {:>14} {:>14} {:>8}".format("Effect", "Full bytes", "Delta bytes", "Saved"))
+    for effect_name, full_bytes, delta_bytes in results:
+        saved = 1.0 - (delta_bytes / full_bytes)
+        print("{:<28} {:>14} {:>14} {:>7.1f}%".format(effect_name, full_bytes, delta_bytes, saved * 100))
+
+if __name__ == "__main__":
+    main()
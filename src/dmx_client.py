@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import os
+import socket
+
+from dmx_protocol import (ARTNET_DMX_HEADER_SIZE, ARTNET_PORT, ARTNET_SEQUENCE_OFFSET, CHANNELS_PER_UNIVERSE, E131_DATA,
+                          E131_DEFAULT_PRIORITY, E131_PORT, E131_SEQUENCE_OFFSET, artnet_dmx_packet, artnet_sync_packet,
+                          e131_data_packet, e131_multicast_address, e131_sync_packet, new_cid, universe_count)
+from frame import frame_buffer
+
+MULTICAST_TTL = 4
+
+
+class DmxClient():
+    def __init__(self, ip, port, start_universe, sync):
+        self._ip = ip
+        self._port = port
+        self._start_universe = start_universe
+        self._sync = sync
+        self._sequence = 0
+        self._packets = []
+        self._byte_count = None
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    def __del__(self):
+        self._socket.close()
+
+    def send_frame(self, frame):
+        data = memoryview(frame_buffer(frame)).cast('B')
+        if len(data) != self._byte_count:
+            self._build_packets(len(data))
+
+        # Each universe carries the next 170 pixels, packets are reused frame to frame
+        for index, (packet, address) in enumerate(self._packets):
+            start = index * CHANNELS_PER_UNIVERSE
+            chunk = data[start:start + CHANNELS_PER_UNIVERSE]
+            header_size = self._header_size()
+            packet[header_size:header_size + len(chunk)] = chunk
+            packet[self._sequence_offset()] = self._sequence
+            self._socket.sendto(packet, address)
+
+        if self._sync:
+            self._send_sync()
+        self._sequence = self._next_sequence()
+        return len(data)
+
+    def universe_count(self):
+        return len(self._packets)
+
+    def _build_packets(self, byte_count):
+        self._byte_count = byte_count
+        self._packets = []
+        for index in range(universe_count(byte_count)):
+            universe = self._start_universe + index
+            slot_count = min(CHANNELS_PER_UNIVERSE, byte_count - index * CHANNELS_PER_UNIVERSE)
+            self._packets.append((self._new_packet(universe, slot_count), self._address(universe)))
+
+    def _next_sequence(self):
+        return (self._sequence + 1) & 0xff
+
+    def _header_size(self):
+        raise NotImplementedError()
+
+    def _sequence_offset(self):
+        raise NotImplementedError()
+
+    def _new_packet(self, universe, slot_count):
+        raise NotImplementedError()
+
+    def _address(self, universe):
+        raise NotImplementedError()
+
+    def _send_sync(self):
+        raise NotImplementedError()
+
+
+class E131Client(DmxClient):
+    def __init__(self, ip=None, start_universe=1, sync_universe=0, priority=E131_DEFAULT_PRIORITY):
+        # Without an ip each universe goes to its standard multicast group
+        super().__init__(ip, E131_PORT, start_universe, sync_universe != 0)
+        self._sync_universe = sync_universe
+        self._priority = priority
+        self._cid = new_cid()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('PIXEL_TARGET_IP') or None,
+                   int(os.getenv('PIXEL_START_UNIVERSE', '1')),
+                   int(os.getenv('PIXEL_SYNC_UNIVERSE', '0')))
+
+    def _header_size(self):
+        return E131_DATA.size
+
+    def _sequence_offset(self):
+        return E131_SEQUENCE_OFFSET
+
+    def _new_packet(self, universe, slot_count):
+        return e131_data_packet(universe, slot_count, self._cid, priority=self._priority, sync_universe=self._sync_universe)
+
+    def _address(self, universe):
+        return (self._ip if self._ip else e131_multicast_address(universe), self._port)
+
+    def _send_sync(self):
+        self._socket.sendto(e131_sync_packet(self._sync_universe, self._sequence, self._cid), self._address(self._sync_universe))
+
+
+class ArtNetClient(DmxClient):
+    def __init__(self, ip, start_universe=0, sync=False):
+        super().__init__(ip, ARTNET_PORT, start_universe, sync)
+        self._sync_packet = artnet_sync_packet()
+        # Art-Net reserves sequence 0 for sequencing disabled, so the counter cycles through 1-255
+        self._sequence = 1
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ['PIXEL_TARGET_IP'],
+                   int(os.getenv('PIXEL_START_UNIVERSE', '0')),
+                   os.getenv('PIXEL_SYNC_UNIVERSE', '0') != '0')
+
+    def _next_sequence(self):
+        return self._sequence % 255 + 1
+
+    def _header_size(self):
+        return ARTNET_DMX_HEADER_SIZE
+
+    def _sequence_offset(self):
+        return ARTNET_SEQUENCE_OFFSET
+
+    def _new_packet(self, universe, slot_count):
+        return artnet_dmx_packet(universe, slot_count)
+
+    def _address(self, universe):
+        return (self._ip, self._port)
+
+    def _send_sync(self):
+        self._socket.sendto(self._sync_packet, (self._ip, self._port))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import struct
+import uuid
+
+PIXELS_PER_UNIVERSE = 170
+CHANNELS_PER_UNIVERSE = PIXELS_PER_UNIVERSE * 3
+
+E131_PORT = 5568
+ARTNET_PORT = 6454
+
+# E1.31 (sACN) root, framing and DMP layers for a data packet, all big endian
+E131_DATA = struct.Struct('!HH12sHI16s' + 'HI64sBHBBH' + 'HBBHHHB')
+# Root and framing layers for a universe synchronization packet
+E131_SYNC = struct.Struct('!HH12sHI16s' + 'HIBHH')
+E131_ACN_ID = b'ASC-E1.17\x00\x00\x00'
+E131_ROOT_VECTOR_DATA = 0x00000004
+E131_ROOT_VECTOR_EXTENDED = 0x00000008
+E131_FRAME_VECTOR_DATA = 0x00000002
+E131_FRAME_VECTOR_SYNC = 0x00000001
+E131_DMP_VECTOR = 0x02
+E131_ADDRESS_TYPE = 0xa1
+E131_DEFAULT_PRIORITY = 100
+E131_FLAGS = 0x7000
+E131_ROOT_OFFSET = 16
+E131_FRAMING_OFFSET = 38
+E131_DMP_OFFSET = 115
+E131_SEQUENCE_OFFSET = 111
+
+# Art-Net mixes byte orders, so headers are packed field by field
+ARTNET_ID = b'Art-Net\x00'
+ARTNET_OP_DMX = 0x5000
+ARTNET_OP_SYNC = 0x5200
+ARTNET_PROTOCOL_VERSION = 14
+ARTNET_DMX_HEADER_SIZE = 18
+ARTNET_SYNC_SIZE = 14
+ARTNET_SEQUENCE_OFFSET = 12
+
+DEFAULT_SOURCE_NAME = 'pixel-tools'
+
+
+class DmxError(Exception):
+    pass
+
+
+def universe_count(byte_count):
+    return (byte_count + CHANNELS_PER_UNIVERSE - 1) // CHANNELS_PER_UNIVERSE
+
+
+def e131_multicast_address(universe):
+    return '239.255.{}.{}'.format(universe >> 8, universe & 0xff)
+
+
+def new_cid():
+    return uuid.uuid4().bytes
+
+
+def e131_data_packet(universe, slot_count, cid, source_name=DEFAULT_SOURCE_NAME,
+                     priority=E131_DEFAULT_PRIORITY, sync_universe=0):
+    # Sequence and slot data are filled in per frame, see E131_SEQUENCE_OFFSET
+    packet = bytearray(E131_DATA.size + slot_count)
+    length = len(packet)
+    E131_DATA.pack_into(packet, 0,
+        0x0010, 0x0000, E131_ACN_ID, E131_FLAGS | (length - E131_ROOT_OFFSET), E131_ROOT_VECTOR_DATA, cid,
+        E131_FLAGS | (length - E131_FRAMING_OFFSET), E131_FRAME_VECTOR_DATA, source_name.encode('utf-8')[:63],
+        priority, sync_universe, 0, 0, universe,
+        E131_FLAGS | (length - E131_DMP_OFFSET), E131_DMP_VECTOR, E131_ADDRESS_TYPE, 0x0000, 0x0001, slot_count + 1, 0x00)
+    return packet
+
+
+def e131_sync_packet(sync_universe, sequence, cid):
+    return E131_SYNC.pack(
+        0x0010, 0x0000, E131_ACN_ID, E131_FLAGS | (E131_SYNC.size - E131_ROOT_OFFSET), E131_ROOT_VECTOR_EXTENDED, cid,
+        E131_FLAGS | (E131_SYNC.size - E131_FRAMING_OFFSET), E131_FRAME_VECTOR_SYNC, sequence, sync_universe, 0)
+
+
+def parse_e131(packet):
+    # Returns ('data', universe, sync universe, slot data) or ('sync', sync universe)
+    if len(packet) >= E131_SYNC.size and packet[4:16] == E131_ACN_ID:
+        root_vector = struct.unpack_from('!I', packet, 18)[0]
+        if root_vector == E131_ROOT_VECTOR_EXTENDED:
+            fields = E131_SYNC.unpack_from(packet)
+            if fields[7] == E131_FRAME_VECTOR_SYNC:
+                return ('sync', fields[9])
+        elif root_vector == E131_ROOT_VECTOR_DATA and len(packet) >= E131_DATA.size:
+            fields = E131_DATA.unpack_from(packet)
+            sync_universe, universe, property_count, start_code = fields[10], fields[13], fields[19], fields[20]
+            if start_code == 0:
+                slot_count = min(property_count - 1, len(packet) - E131_DATA.size)
+                return ('data', universe, sync_universe, memoryview(packet)[E131_DATA.size:E131_DATA.size + slot_count])
+    raise DmxError("Not an E1.31 data or sync packet")
+
+
+def artnet_dmx_packet(universe, slot_count):
+    # DMX lengths must be even, a trailing pad byte is left at zero
+    length = slot_count + (slot_count % 2)
+    packet = bytearray(ARTNET_DMX_HEADER_SIZE + length)
+    struct.pack_into('<8sH', packet, 0, ARTNET_ID, ARTNET_OP_DMX)
+    struct.pack_into('>H', packet, 10, ARTNET_PROTOCOL_VERSION)
+    struct.pack_into('<H', packet, 14, universe & 0x7fff)
+    struct.pack_into('>H', packet, 16, length)
+    return packet
+
+
+def artnet_sync_packet():
+    packet = bytearray(ARTNET_SYNC_SIZE)
+    struct.pack_into('<8sH', packet, 0, ARTNET_ID, ARTNET_OP_SYNC)
+    struct.pack_into('>H', packet, 10, ARTNET_PROTOCOL_VERSION)
+    return bytes(packet)
+
+
+def parse_artnet(packet):
+    # Returns ('data', universe, None, slot data) or ('sync', None) to line up with parse_e131
+    if len(packet) >= 10 and packet[:8] == ARTNET_ID:
+        opcode = struct.unpack_from('<H', packet, 8)[0]
+        if opcode == ARTNET_OP_SYNC:
+            return ('sync', None)
+        if opcode == ARTNET_OP_DMX and len(packet) >= ARTNET_DMX_HEADER_SIZE:
+            universe = struct.unpack_from('<H', packet, 14)[0]
+            length = min(struct.unpack_from('>H', packet, 16)[0], len(packet) - ARTNET_DMX_HEADER_SIZE)
+            return ('data', universe, None, memoryview(packet)[ARTNET_DMX_HEADER_SIZE:ARTNET_DMX_HEADER_SIZE + length])
+    raise DmxError("Not an Art-Net DMX or sync packet")
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+import numpy as np
+
+from frame import Frame
+
 class EffectBase():
     def __init__(self, pixel_map):
         self._map = pixel_map
+        self._frame = Frame(len(pixel_map))
+        self._fade_level = 0.0
         self.setup()
         self.reset()
         self._fade_out_timer = 0
@@ -18,15 +24,12 @@ class EffectBase():
         pass
 
     def animate(self, delta_t):
-        # Do all animation related work here, return the byte string to be displayed
+        # Do all animation related work here, write into self._frame and return it
         raise NotImplementedError()
 
     def animate_base(self, delta_t):
         frame = self.animate(delta_t)
 
-        if self._fade_out_complete:
-            frame = bytearray(len(frame))
-
         percent = 1.0
         if self._fade_in_active:
             self._fade_in_timer -= delta_t
@@ -39,7 +42,9 @@ class EffectBase():
         if self._fade_in_active or self._fade_out_active:
             percent = percent if percent >= 0.0 else 0.0
             percent = percent if percent <= 1.0 else 1.0
-            frame = bytearray([int(float(elem) * percent) for elem in frame])
+
+        # The fade itself is applied by the animator's output stage
+        self._fade_level = 0.0 if self._fade_out_complete else percent
 
         if self._fade_in_active or self._fade_out_active:
             if self._fade_in_timer < 0:
@@ -49,6 +54,9 @@ class EffectBase():
 
         return frame
 
+    def fade_level(self):
+        return self._fade_level
+
     def fade_in(self, time_s):
         if self._fade_in_active:
             return
@@ -69,3 +77,38 @@ class EffectBase():
     def reset(self):
         # Use this to reset state of effect back to beginning
         pass
+
+
+class ShaderEffectBase(EffectBase):
+    def __init__(self, pixel_map):
+        coords = pixel_map.coords()
+        self._x = np.ascontiguousarray(coords[:, 0])
+        self._y = np.ascontiguousarray(coords[:, 1])
+        self._z = np.ascontiguousarray(coords[:, 2])
+        self._time = 0.0
+        self._params = {}
+        self._shade_buffer = np.empty((len(pixel_map), 3), dtype=np.float32)
+        super().__init__(pixel_map)
+
+    def update(self, delta_t, params):
+        # Advance effect state here and publish anything the shader needs into params
+        pass
+
+    def shade(self, x, y, z, t, params):
+        # Return colors for every pixel at once, either floats from 0.0 to 1.0 or uint8,
+        # in any shape that broadcasts to (pixel count, 3)
+        raise NotImplementedError()
+
+    def animate(self, delta_t):
+        self._time += delta_t
+        self.update(delta_t, self._params)
+        rgb = self.shade(self._x, self._y, self._z, self._time, self._params)
+
+        pixels = self._frame.pixels()
+        if rgb.dtype == np.uint8:
+            np.copyto(pixels, rgb)
+        else:
+            np.multiply(rgb, 255, out=self._shade_buffer)
+            np.clip(self._shade_buffer, 0, 255, out=self._shade_buffer)
+            np.copyto(pixels, self._shade_buffer, casting='unsafe')
+        return self._frame
@@ -9,48 +9,38 @@ from random import random
 
 from animator import Animator
 from client import Client
-from effect_base import EffectBase
+from effect_base import ShaderEffectBase
 from sim_client import SimClient
-from utils import PixelMap, calc_affine, calc_affine2, hsl_to_rgb
+from utils import HueLUT, PixelMap, calc_affine, calc_affine2
 
 TARGET_FPS = 30
 SPEED = 2
 
-class BeachballEffect(EffectBase):
+class BeachballEffect(ShaderEffectBase):
+    def setup(self):
+        self._hue_lut = HueLUT()
+
+        # The rotation never changes so the polar angles only need computing once
+        self._rotated_map = self._map.transform(calc_affine2(0, math.pi / 2, 0, -0.75, 0, 0))
+        self._polar_map = self._rotated_map.geometry().cylindrical()[1] + math.pi
+
     def reset(self):
         self._speed = SPEED
 
         self._progress = 0
         self._current_map = self._map
 
-        self._rotated_map = self._map.transform(calc_affine2(0, math.pi / 2, 0, -0.75, 0, 0))
-        self._polar_map = {}
-
-        for pixel in self._rotated_map:
-            x, y, z = pixel.coords()
-            self._polar_map[pixel.index()] = math.atan2(y, x) + math.pi
-
-    def animate(self, delta_t):
+    def update(self, delta_t, params):
         # Find our current progress
         self._progress = (self._speed * delta_t) + self._progress
         if self._progress > 2 * math.pi:
             self._progress = 0
 
-        buffer = bytearray()
-        for pixel in self._current_map:
-            current_offset = self._progress * 180 / math.pi
-            pixel_radians = (self._polar_map[pixel.index()] + self._progress) * 180 / math.pi
-            red, green, blue = hsl_to_rgb(pixel_radians, 1.0, 1.0)
-            intensity_data = self.intensity_data(red, green, blue, 1.0)
-            buffer.extend(intensity_data)
-        return buffer
+        params['progress'] = self._progress
 
-    def intensity_data(self, red, green, blue, intensity):
-        return b''.join([
-                int(255 * red * intensity).to_bytes(1, 'big'),
-                int(255 * green * intensity).to_bytes(1, 'big'),
-                int(255 * blue * intensity).to_bytes(1, 'big')
-        ])
+    def shade(self, x, y, z, t, params):
+        pixel_degrees = (self._polar_map + params['progress']) * 180 / math.pi
+        return self._hue_lut.lookup(pixel_degrees)
 
 
 def main():
@@ -14,7 +14,7 @@ from animator import Animator
 from client import Client
 from effect_base import EffectBase
 from sim_client import SimClient
-from utils import PixelMap, calc_affine, hsl_to_rgb
+from utils import PixelMap, calc_affine, hsl_to_rgb_array
 
 TARGET_FPS = 1
 CELL_SIZE = 0.25
@@ -22,174 +22,170 @@ SPEED = 0.75
 
 #TODO: Fade from one game state to the next and optimize pixel drawing
 
-# 4555 or 5766
+# Bays style rules, survive when E <= n <= F and birth when G <= n <= H
+RULE_4555 = '4555'
+RULE_5766 = '5766'
+GAME_RULE = RULE_4555
+PACKED_BOARD = False
+BOARD_DENSITY = 0.2
+NEIGHBOR_TOTALS = 28
+
+def parse_rule(rule):
+    if isinstance(rule, str):
+        rule = [int(value) for value in rule]
+    survive_min, survive_max, birth_min, birth_max = rule
+    return (survive_min, survive_max, birth_min, birth_max)
+
+
 class GameOfLife3D():
-    def __init__(self, x, y, z):
-        self._game_board = np.zeros((x, y, z))
+    def __init__(self, x, y, z, rule=GAME_RULE, packed=False):
+        if packed and x % 8 != 0:
+            raise ValueError("Packed boards need an x size that is a multiple of 8")
+
         self._x = x
         self._y = y
         self._z = z
+        self._packed = packed
+        self._board_cache = None
+        self.set_rule(rule)
 
         # Randomly init game board
-        for x_index in range(0, x):
-            for y_index in range(0, y):
-                for z_index in range(0, z):
-                    self._game_board[x_index][y_index][z_index] = 0 if random() < 0.8 else 1
-
-    def step(self):
-        new_game = self._game_board.copy()
-        for x_index in range(0, self._x):
-            for y_index in range(0, self._y):
-                for z_index in range(0, self._z):
-                    ln = self.live_neighbors(x_index, y_index, z_index)
-                    if self._game_board[x_index, y_index, z_index] == 1 and ln < 4 or ln > 5:
-                        new_game[x_index][y_index][z_index] = 0
-                    if self._game_board[x_index, y_index, z_index] == 0 and ln <= 5 and ln >= 5:
-                        new_game[x_index][y_index][z_index] = 1
-        self._game_board = new_game
-
-    def live_neighbors(self, x, y, z):
-        live_count = 0
-        for value in self.iter_adjacents(x, y, z):
-            live_count = live_count + value
-        return live_count
-
-    def iter_adjacents(self, x, y, z):
-        gbd = self._game_board.shape
-        for x_i in range(x-1, x+2):
-            new_x = x_i if x_i >= 0 else gbd[0]-x_i
-            new_x = x_i if x_i < gbd[0] else 0
-            for y_i in range(y-1, y+2):
-                new_y = y_i if y_i >= 0 else gbd[1]-y_i
-                new_y = y_i if y_i < gbd[1] else 0
-                for z_i in range(z-1, z+2):
-                    new_z = z_i if z_i >= 0 else gbd[2]-z_i
-                    new_z = z_i if z_i < gbd[2] else 0
-                    yield self._game_board[new_x, new_y, new_z]
-
-    def live_cells(self):
-        live_cells = np.where(self._game_board == 1)
-        if live_cells:
-            return zip(live_cells[0], live_cells[1], live_cells[2])
-        else:
-            return ((), (), ())
+        board = np.random.random((x, y, z)) < BOARD_DENSITY
+        self._game_board = self._pack(board) if packed else board
 
+    def set_rule(self, rule):
+        survive_min, survive_max, birth_min, birth_max = parse_rule(rule)
 
-class AABB():
-    def __init__(self, x_start, x_stop, y_start, y_stop, z_start, z_stop):
-        self._x_start = x_start
-        self._x_stop = x_stop
-        self._y_start = y_start
-        self._y_stop = y_stop
-        self._z_start = z_start
-        self._z_stop = z_stop
+        # Neighbor totals below include the cell itself, so live cells are offset by one
+        totals = np.arange(NEIGHBOR_TOTALS)
+        self._survive_totals = totals[(totals - 1 >= survive_min) & (totals - 1 <= survive_max)]
+        self._birth_totals = totals[(totals >= birth_min) & (totals <= birth_max)]
+        self._survive_table = np.isin(totals, self._survive_totals)
+        self._birth_table = np.isin(totals, self._birth_totals)
 
-    def inside(self, x, y, z):
-        return x > self._x_start and x < self._x_stop and \
-               y > self._y_start and y < self._y_stop and \
-               z > self._z_start and z < self._z_stop
-
-    def contains(self, tup):
-        return self.inside(tup[0], tup[1], tup[2])
-
-    def __str__(self):
-        return "x: {} -> {} y: {} -> {} z: {} -> {} ".format(self._x_start, self._x_stop, self._y_start, self._y_stop, self._z_start, self._z_stop)
+    def step(self):
+        if self._packed:
+            self._game_board = self._step_packed(self._game_board)
+        else:
+            self._game_board = self._step_dense(self._game_board)
+        self._board_cache = None
+
+    def _step_dense(self, board):
+        # Sum the 3x3x3 block around every cell one axis at a time, rolling for toroidal wrap
+        totals = board.astype(np.uint8)
+        for axis in range(3):
+            totals = totals + np.roll(totals, 1, axis) + np.roll(totals, -1, axis)
+        return np.where(board, self._survive_table[totals], self._birth_table[totals])
+
+    def _step_packed(self, words):
+        # Each byte holds 8 cells spread along x, counts are kept as bit planes
+        planes = self._add_planes(self._add_planes([words], [self._shift_x(words, 1)], 2),
+                                  [self._shift_x(words, -1)], 2)
+        for axis, width in ((1, 4), (2, 5)):
+            planes = self._add_planes(
+                self._add_planes(planes, [np.roll(plane, 1, axis) for plane in planes], width),
+                [np.roll(plane, -1, axis) for plane in planes], width)
+
+        survive = self._match_planes(planes, self._survive_totals)
+        birth = self._match_planes(planes, self._birth_totals)
+        return (words & survive) | (~words & birth)
+
+    def _shift_x(self, words, offset):
+        # Cells that roll off the end of one strip land at the start of the next bit's strip
+        shifted = np.roll(words, offset, axis=0)
+        if offset > 0:
+            shifted[0] = (shifted[0] << 1) | (shifted[0] >> 7)
+        else:
+            shifted[-1] = (shifted[-1] >> 1) | (shifted[-1] << 7)
+        return shifted
+
+    def _add_planes(self, a, b, width):
+        zero = np.zeros_like(a[0])
+        a = a + [zero] * (width - len(a))
+        b = b + [zero] * (width - len(b))
+        result = []
+        carry = zero
+        for bit_a, bit_b in zip(a, b):
+            partial = bit_a ^ bit_b
+            result.append(partial ^ carry)
+            carry = (bit_a & bit_b) | (partial & carry)
+        return result
+
+    def _match_planes(self, planes, values):
+        matched = np.zeros_like(planes[0])
+        for value in values:
+            equal = np.full_like(planes[0], 0xFF)
+            for bit, plane in enumerate(planes):
+                equal &= plane if (value >> bit) & 1 else ~plane
+            matched |= equal
+        return matched
+
+    def _pack(self, board):
+        strips = board.reshape(8, self._x // 8, self._y, self._z)
+        return np.packbits(strips, axis=0, bitorder='little')[0]
+
+    def _unpack(self, words):
+        strips = np.unpackbits(words[np.newaxis], axis=0, count=8, bitorder='little')
+        return strips.reshape(self._x, self._y, self._z).astype(bool)
+
+    def board(self):
+        if not self._packed:
+            return self._game_board
+        if self._board_cache is None:
+            self._board_cache = self._unpack(self._game_board)
+        return self._board_cache
+
+    def live_count(self):
+        return int(np.count_nonzero(self.board()))
 
-    def __repr__(self):
-        return self.__str__()
+    def live_cells(self):
+        live_cells = np.nonzero(self.board())
+        return zip(live_cells[0], live_cells[1], live_cells[2])
 
 
 class ConwaysGameOfLifeEffect(EffectBase):
     def setup(self):
-        # Find the extents of the tree
-        self.x_min = math.inf
-        self.x_max = 0
-        self.y_min = math.inf
-        self.y_max = 0
-        self.z_min = math.inf
-        self.z_max = 0
-
-        for pixel in self._map:
-            if pixel.coords()[0] > self.x_max:
-                self.x_max = pixel.coords()[0]
-            if pixel.coords()[0] < self.x_min:
-                self.x_min = pixel.coords()[0]
-            if pixel.coords()[1] > self.y_max:
-                self.y_max = pixel.coords()[1]
-            if pixel.coords()[1] < self.y_min:
-                self.y_min = pixel.coords()[1]
-            if pixel.coords()[2] > self.z_max:
-                self.z_max = pixel.coords()[2]
-            if pixel.coords()[2] < self.z_min:
-                self.z_min = pixel.coords()[2]
-
-        # Add some buffer onto tree extents
-        self.x_min = self.x_min - CELL_SIZE
-        self.x_max = self.x_max + CELL_SIZE
-        self.y_min = self.y_min - CELL_SIZE
-        self.y_max = self.y_max + CELL_SIZE
-        self.z_min = self.z_min - CELL_SIZE
-        self.z_max = self.z_max + CELL_SIZE
-
-        # Build AABB matrix
+        # Find the extents of the tree and add some buffer onto them
+        bounds_min, bounds_max = self._map.geometry().bounds()
+        self.x_min, self.y_min, self.z_min = (bounds_min - CELL_SIZE).tolist()
+        self.x_max, self.y_max, self.z_max = (bounds_max + CELL_SIZE).tolist()
+
+        # Size the game grid
         self.x_cells = math.ceil((self.x_max - self.x_min) / CELL_SIZE)
         self.y_cells = math.ceil((self.y_max - self.y_min) / CELL_SIZE)
         self.z_cells = math.ceil((self.z_max - self.z_min) / CELL_SIZE)
+        if PACKED_BOARD:
+            self.x_cells = math.ceil(self.x_cells / 8) * 8
 
-        self._aabbs = []
-        for x_index in range(0, self.x_cells):
-            self._aabbs.append([])
-            for y_index in range(0, self.y_cells):
-                self._aabbs[x_index].append([])
-                for z_index in range(0, self.z_cells):
-                    self._aabbs[x_index][y_index].append([])
-                    self._aabbs[x_index][y_index][z_index] = AABB(
-                            self.x_min + (CELL_SIZE * x_index),
-                            self.x_min + (CELL_SIZE * (x_index + 1)),
-                            self.y_min + (CELL_SIZE * y_index),
-                            self.y_min + (CELL_SIZE * (y_index + 1)),
-                            self.z_min + (CELL_SIZE * z_index),
-                            self.z_min + (CELL_SIZE * (z_index + 1)),
-                   )
+        # Flat index of the grid cell each pixel falls in, so rendering is a single gather
+        cell_origin = np.array([self.x_min, self.y_min, self.z_min], dtype=np.float32)
+        pixel_cells = np.floor((self._map.coords() - cell_origin) / CELL_SIZE).astype(np.intp)
+        self._pixel_cell = np.ravel_multi_index(pixel_cells.T, (self.x_cells, self.y_cells, self.z_cells))
 
     def reset(self):
         # Setup internal timer for custom game refresh
         self._timer = 0
         self._visible_live_cells_false_count = 0
         self._live_pixel_history = []
+        self._board_dirty = True
         # Figure out extents of tree
-        self._game = GameOfLife3D(self.x_cells, self.y_cells, self.z_cells)
+        self._game = GameOfLife3D(self.x_cells, self.y_cells, self.z_cells, GAME_RULE, PACKED_BOARD)
 
-        # Pre-compute the bytes strings for this game round
+        # Pick the live cell color for this game round
         hue = random() * 360.0
-        red, green, blue = hsl_to_rgb(hue, 1.0, 1.0)
-        self._on_pixel = b''.join([
-                int(255 * red).to_bytes(1, 'big'),
-                int(255 * green).to_bytes(1, 'big'),
-                int(255 * blue).to_bytes(1, 'big')
-        ])
-        self._off_pixel = b''.join([int(0).to_bytes(1, 'big'), int(0).to_bytes(1, 'big'), int(0).to_bytes(1, 'big')])
+        self._on_pixel = hsl_to_rgb_array(hue, 1.0, 1.0)
 
 
     def animate(self, delta_t):
         self._timer += delta_t
 
-        # Find the alive aabbs
-        alive_aabbs = []
-        for cell in self._game.live_cells():
-            alive_aabbs.append(self._aabbs[cell[0]][cell[1]][cell[2]])
-
-        # Find which pixels should be active
-        live_pixels = []
-        pixel_buffer = bytearray()
-        for pixel in self._map:
-            for aabb in alive_aabbs:
-                if aabb.contains(pixel.coords()):
-                    pixel_buffer.extend(self._on_pixel)
-                    live_pixels.append(pixel.index())
-                    break
-            else:
-                pixel_buffer.extend(self._off_pixel)
+        # Only redraw when the board has changed since the last frame
+        if self._board_dirty:
+            live = self._game.board().ravel()[self._pixel_cell]
+            np.multiply(live[:, np.newaxis], self._on_pixel, out=self._frame.pixels())
+            self._live_pixels = np.flatnonzero(live)
+            self._board_dirty = False
+        live_pixels = self._live_pixels
 
         # Step the sim for the next render
         if self._timer > 2:
@@ -204,17 +200,18 @@ class ConwaysGameOfLifeEffect(EffectBase):
             self._live_pixel_history.append(live_pixels)
             if len(self._live_pixel_history) > 2:
                 self._live_pixel_history.pop(0)
-                if all([ph == self._live_pixel_history[0] for ph in self._live_pixel_history]):
+                if all([np.array_equal(ph, self._live_pixel_history[0]) for ph in self._live_pixel_history]):
                     self._visible_live_cells_false_count = 5
 
 
             # Check if this iteration has died out
-            if len(list(self._game.live_cells())) <= 0 or self._visible_live_cells_false_count >= 5:
+            if self._game.live_count() <= 0 or self._visible_live_cells_false_count >= 5:
                 self.reset()
 
             self._game.step()
+            self._board_dirty = True
 
-        return pixel_buffer
+        return self._frame
 
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == 'sim':
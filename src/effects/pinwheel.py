@@ -10,21 +10,20 @@ from random import random
 
 from animator import Animator
 from client import Client
-from effect_base import EffectBase
+from effect_base import ShaderEffectBase
 from sim_client import SimClient
 from utils import PixelMap, calc_affine, calc_affine2, hsl_to_rgb
 
 TARGET_FPS = 30
 SPEED = 1
 
-class PinwheelEffect(EffectBase):
+class PinwheelEffect(ShaderEffectBase):
     def reset(self):
-        self._current_map = self._map.transform(calc_affine2(0, 0, 0, 0, 0, -0.5))
         self._progress = 0
         self._current_color = (1, 1, 1)
         self._speed = SPEED
 
-    def animate(self, delta_t):
+    def update(self, delta_t, params):
         # Find our current progress
         self._progress = (self._speed * delta_t) + self._progress
         if self._progress > math.pi / 2:
@@ -34,26 +33,18 @@ class PinwheelEffect(EffectBase):
             hue = random() * 360.0
             self._current_color = hsl_to_rgb(hue, 1.0, 1.0)
 
-        # Rotate the tree based on progress
-        self._current_map = self._map.transform(calc_affine(self._progress, 0.0, 0.0))
+        # Rotate the tree based on progress, only the rotated z axis is needed
+        params['axis'] = calc_affine(self._progress, 0.0, 0.0)[2, :3]
+        params['color'] = np.array(self._current_color, dtype=np.float32)
 
-        buffer = bytearray()
-        red, green, blue = self._current_color
-        for pixel in self._current_map:
-            gaussian = self.gaussian(pixel.coords()[2], 0)
-            intensity_data = self.intensity_data(red, green, blue, min(gaussian, 1.0))
-            buffer.extend(intensity_data)
-        return buffer
+    def shade(self, x, y, z, t, params):
+        axis_x, axis_y, axis_z = params['axis']
+        rotated_z = axis_x * x + axis_y * y + axis_z * z
+        gaussian = np.minimum(self.gaussian(rotated_z, 0), 1.0)
+        return gaussian[:, np.newaxis] * params['color']
 
     def gaussian(self, value, offset):
-        return math.e ** (-(value + offset) ** 2 * 100)
-
-    def intensity_data(self, red, green, blue, intensity):
-        return b''.join([
-                int(255 * red * intensity).to_bytes(1, 'big'),
-                int(255 * green * intensity).to_bytes(1, 'big'),
-                int(255 * blue * intensity).to_bytes(1, 'big')
-        ])
+        return np.exp(-(value + offset) ** 2 * 100)
 
 
 def main():
@@ -10,56 +10,51 @@ from random import random
 
 from animator import Animator
 from client import Client
-from effect_base import EffectBase
+from effect_base import ShaderEffectBase
 from sim_client import SimClient
 from utils import PixelMap, calc_affine, hsl_to_rgb
 
 TARGET_FPS = 30
 SPEED = 0.75
 
-class PlaneWaveEffect(EffectBase):
+class PlaneWaveEffect(ShaderEffectBase):
     def reset(self):
         self._speed = SPEED
 
         self._progress = -2
-        self._current_map = self._map
+        self._current_axis = np.array([0.0, 0.0, 1.0], dtype=np.float32)
         self._current_color = (1, 1, 1)
 
 
-    def animate(self, delta_t):
+    def update(self, delta_t, params):
         # Find our current progress
         self._progress = (self._speed * delta_t) + self._progress
         if self._progress > 2:
             self._progress = -2
 
-            # Pick an orientation at random
+            # Pick an orientation at random, the wave travels along the rotated z axis
             x = random() * 2 * math.pi
             y = random() * 2 * math.pi
             z = random() * 2 * math.pi
             transform_mat = calc_affine(x, y, z)
-            self._current_map = self._map.transform(transform_mat)
+            self._current_axis = transform_mat[2, :3]
 
             # Choose a random hue
             hue = random() * 360.0
             self._current_color = hsl_to_rgb(hue, 1.0, 1.0)
 
-        buffer = bytearray()
-        red, green, blue = self._current_color
-        for pixel in self._current_map:
-            gaussian = self.gaussian(pixel.coords()[2], self._progress)
-            intensity_data = self.intensity_data(red, green, blue, gaussian)
-            buffer.extend(intensity_data)
-        return buffer
+        params['progress'] = self._progress
+        params['axis'] = self._current_axis
+        params['color'] = np.array(self._current_color, dtype=np.float32)
+
+    def shade(self, x, y, z, t, params):
+        axis_x, axis_y, axis_z = params['axis']
+        rotated_z = axis_x * x + axis_y * y + axis_z * z
+        gaussian = self.gaussian(rotated_z, params['progress'])
+        return gaussian[:, np.newaxis] * params['color']
 
     def gaussian(self, value, offset):
-        return math.e ** (-(value + offset) ** 2 * 250)
-
-    def intensity_data(self, red, green, blue, intensity):
-        return b''.join([
-                int(256 * red * intensity).to_bytes(1, 'big'),
-                int(256 * green * intensity).to_bytes(1, 'big'),
-                int(256 * blue * intensity).to_bytes(1, 'big')
-        ])
+        return np.exp(-(value + offset) ** 2 * 250)
 
 
 def main():
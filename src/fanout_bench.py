@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from client import PROTOCOL_FRAMED, Client
+from fanout_client import DEFAULT_SEGMENT_WINDOW, FanOutClient
+from frame import Frame
+from renderer import InterpolatingRenderer
+
+BENCH_FRAMES = 300
+BENCH_BASE_PORT = 17700
+# Pixels per stand-in controller, the second one is given a fixed extra latency
+SEGMENT_PIXELS = (600, 400)
+SEGMENT_LATENCIES = (None, 0.05)
+SERVER_START_TIME = 1.0
+
+# The sync check runs two segments over simulated links in process, the first pixel ramps one level per frame
+SYNC_FRAMES = 90
+SYNC_FPS = 30
+SYNC_PIXELS = 10
+SYNC_LATENCIES = (0.005, 0.055)
+SYNC_DELAY = 0.1
+SYNC_RENDER_PERIOD = 0.001
+SYNC_TOLERANCE = 0.005
+
+
+class LinkClient():
+    # Stands in for a Client on a link with a fixed one way latency, frames land on a server side renderer
+    def __init__(self, renderer, latency, port, compensate):
+        self._renderer = renderer
+        self._latency = latency
+        self._port = port
+        self._compensate = compensate
+        self._playout_delay_ns = 0
+
+    def address(self):
+        return ('link', self._port)
+
+    def rtt(self):
+        return 2 * self._latency
+
+    def set_playout_delay(self, seconds):
+        self._playout_delay_ns = int(seconds * 1e9) if self._compensate else 0
+
+    def send_frame(self, frame, sequence=None):
+        data = bytes(frame.buffer())
+        threading.Timer(self._latency, self._renderer.submit, (data, frame.timestamp(), self._playout_delay_ns)).start()
+        return len(data)
+
+
+class PresentationLog():
+    # Fake strip that notes when the first pixel first shows each level
+    def __init__(self, pixel_count):
+        self._pixel_count = pixel_count
+        self._times = {}
+
+    def __len__(self):
+        return self._pixel_count
+
+    def byte_count(self):
+        return self._pixel_count * 3
+
+    def wire_time(self):
+        return SYNC_RENDER_PERIOD
+
+    def set_frame(self, frame):
+        self._times.setdefault(int(frame[0, 0]), time.monotonic())
+        return True
+
+    def times(self):
+        return self._times
+
+
+def start_servers(base_port):
+    # Local stand-in controllers, server.py on the fake LED backend
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    return [subprocess.Popen([sys.executable, server_path, '--backend', 'fake', '--port', str(base_port + index),
+                              '--count', str(pixel_count)], stdout=subprocess.DEVNULL)
+            for index, pixel_count in enumerate(SEGMENT_PIXELS)]
+
+
+def sync_offsets(compensate):
+    # Returns how much later the second segment showed each level than the first, in seconds
+    logs = [PresentationLog(SYNC_PIXELS) for _ in SYNC_LATENCIES]
+    renderers = [InterpolatingRenderer(log, SYNC_DELAY, SYNC_FPS).start() for log in logs]
+    segments = [(LinkClient(renderer, latency, index, compensate), index * SYNC_PIXELS, SYNC_PIXELS, None)
+                for index, (renderer, latency) in enumerate(zip(renderers, SYNC_LATENCIES))]
+    fanout = FanOutClient(segments)
+
+    frame = Frame(SYNC_PIXELS * len(segments))
+    next_frame = time.monotonic()
+    for index in range(SYNC_FRAMES):
+        frame.fill((index, 0, 0))
+        frame.set_timestamp(time.time_ns())
+        fanout.send_frame(frame)
+        next_frame += 1 / SYNC_FPS
+        time.sleep(max(next_frame - time.monotonic(), 0))
+    time.sleep(SYNC_DELAY + max(SYNC_LATENCIES) * 2 + 0.1)
+    for renderer in renderers:
+        renderer.close()
+
+    # The first levels are shown before the clock offset settles and the last one is held, so both are left out
+    first, second = (log.times() for log in logs)
+    levels = [level for level in range(2, SYNC_FRAMES - 1) if level in first and level in second]
+    return np.array([second[level] - first[level] for level in levels])
+
+
+def check_sync():
+    # Two segments with different latencies should show the same frame at the same time
+    for compensate in (False, True):
+        offsets = sync_offsets(compensate)
+        print("{} compensation: second segment {:.1f}ms behind on average, {:.1f}ms at worst, over {} frames".format(
+            "With" if compensate else "Without", offsets.mean() * 1000, np.abs(offsets).max() * 1000, len(offsets)))
+    if len(offsets) == 0 or np.abs(offsets).max() > SYNC_TOLERANCE:
+        raise SystemExit("Segments are out of sync by more than {:.1f}ms".format(SYNC_TOLERANCE * 1000))
+    print("Segments in sync")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--sync':
+        check_sync()
+        return
+    frame_count = int(sys.argv[1]) if len(sys.argv) > 1 else BENCH_FRAMES
+    servers = start_servers(BENCH_BASE_PORT)
+    try:
+        time.sleep(SERVER_START_TIME)
+        segments = []
+        first = 0
+        for index, (pixel_count, latency) in enumerate(zip(SEGMENT_PIXELS, SEGMENT_LATENCIES)):
+            client = Client(False, '127.0.0.1', BENCH_BASE_PORT + index, PROTOCOL_FRAMED, window=DEFAULT_SEGMENT_WINDOW)
+            segments.append((client, first, pixel_count, latency))
+            first += pixel_count
+        fanout = FanOutClient(segments)
+
+        frame = Frame(first)
+        send_times = np.zeros(frame_count)
+        for index in range(frame_count):
+            frame.fill((index % 256, 0, 0))
+            frame.set_timestamp(time.time_ns())
+            send_start = time.perf_counter()
+            fanout.send_frame(frame)
+            send_times[index] = time.perf_counter() - send_start
+
+        print("{} frames to {} stand-in controllers".format(frame_count, len(SEGMENT_PIXELS)))
+        print("send_frame p50 {:.3f}ms p95 {:.3f}ms max {:.3f}ms".format(
+            np.percentile(send_times, 50) * 1000, np.percentile(send_times, 95) * 1000, send_times.max() * 1000))
+        print(fanout.summary())
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from client import Client
+from frame import Frame
+
+SLOW_SEGMENT_TIME = 0.010
+# Round trips are only measured while frames are in flight, so segments always run with a window
+DEFAULT_SEGMENT_WINDOW = 2
+SEGMENT_STATS_WINDOW = 300
+REPORT_INTERVAL = 10
+
+
+def parse_segments(spec):
+    # "ip:port:first-last[:latency],..." gives (ip, port, first pixel, pixel count, latency seconds) per controller
+    segments = []
+    for entry in spec.split(','):
+        fields = entry.strip().split(':')
+        if len(fields) not in (3, 4):
+            raise ValueError("Bad segment, expected ip:port:first-last[:latency]: {}".format(entry))
+        first, _, last = fields[2].partition('-')
+        first = int(first)
+        last = int(last) if last else first
+        if last < first:
+            raise ValueError("Bad pixel range for {}:{}: {}".format(fields[0], fields[1], fields[2]))
+        latency = float(fields[3]) if len(fields) == 4 else None
+        segments.append((fields[0], int(fields[1]), first, last - first + 1, latency))
+    return segments
+
+
+class Segment():
+    def __init__(self, client, first, count, latency=None):
+        self._client = client
+        self._first = first
+        self._count = count
+        # None measures the latency from the client's round trip time instead
+        self._latency = latency
+        self._send_times = deque(maxlen=SEGMENT_STATS_WINDOW)
+        self._slow_frames = 0
+
+    def name(self):
+        ip, port = self._client.address()
+        return "{}:{} [{}-{}]".format(ip, port, self._first, self._first + self._count - 1)
+
+    def first(self):
+        return self._first
+
+    def count(self):
+        return self._count
+
+    def latency(self):
+        if self._latency is not None:
+            return self._latency
+        rtt = self._client.rtt()
+        return rtt / 2 if rtt is not None else 0.0
+
+    def set_playout_delay(self, seconds):
+        self._client.set_playout_delay(seconds)
+
+    def send(self, frame, sequence):
+        send_start = time.perf_counter()
+        self._client.send_frame(frame, sequence=sequence)
+        send_time = time.perf_counter() - send_start
+        self._send_times.append(send_time)
+        if send_time > SLOW_SEGMENT_TIME:
+            self._slow_frames += 1
+        return send_time
+
+    def summary(self):
+        send_times = np.array(self._send_times) if self._send_times else np.zeros(1)
+        return "{} send p50 {:.1f}ms p95 {:.1f}ms max {:.1f}ms, {} slow, latency {:.1f}ms".format(
+            self.name(), np.percentile(send_times, 50) * 1000, np.percentile(send_times, 95) * 1000,
+            send_times.max() * 1000, self._slow_frames, self.latency() * 1000)
+
+    def is_slow(self):
+        return len(self._send_times) > 0 and np.percentile(self._send_times, 95) > SLOW_SEGMENT_TIME
+
+
+class FanOutClient():
+    def __init__(self, segments):
+        # Each segment is (client, first pixel, pixel count, latency or None)
+        self._segments = [Segment(*segment) for segment in segments]
+        self._executor = ThreadPoolExecutor(max_workers=len(self._segments), thread_name_prefix='fanout')
+        self._sequence = 0
+        self._last_report = time.monotonic()
+
+    @classmethod
+    def from_env(cls, spec=None):
+        spec = spec if spec else os.environ['PIXEL_SEGMENTS']
+        window = int(os.getenv('PIXEL_TARGET_WINDOW', '0')) or DEFAULT_SEGMENT_WINDOW
+        return cls([(Client(False, ip, port, window=window), first, count, latency)
+                    for ip, port, first, count, latency in parse_segments(spec)])
+
+    def __del__(self):
+        self._executor.shutdown(wait=False)
+
+    def segments(self):
+        return self._segments
+
+    def send_frame(self, frame):
+        # Every controller gets the same sequence and presentation time, and all sends run at once
+        if not isinstance(frame, Frame):
+            frame = Frame.from_pixels(np.frombuffer(frame, dtype=np.uint8).reshape(-1, 3))
+            frame.set_timestamp(time.time_ns())
+
+        # Faster controllers are asked to hold each frame back by the difference so every segment flips together
+        latencies = [segment.latency() for segment in self._segments]
+        slowest = max(latencies)
+        sequence = self._sequence
+        futures = []
+        for segment, latency in zip(self._segments, latencies):
+            segment.set_playout_delay(slowest - latency)
+            futures.append(self._executor.submit(segment.send, frame.view(segment.first(), segment.count()), sequence))
+        for future in futures:
+            future.result()
+        self._sequence += 1
+
+        if time.monotonic() - self._last_report > REPORT_INTERVAL:
+            self._last_report = time.monotonic()
+            self.report()
+        return frame.byte_count()
+
+    def report(self):
+        for segment in self._segments:
+            if segment.is_slow():
+                print("Slow segment: {}".format(segment.summary()))
+
+    def summary(self):
+        return "\n".join(segment.summary() for segment in self._segments)
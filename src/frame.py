@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+class Frame():
+    def __init__(self, pixel_count):
+        # One RGB row per pixel, allocated once and written in place every frame
+        self._pixels = np.zeros((pixel_count, 3), dtype=np.uint8)
+        self._buffer = memoryview(self._pixels.reshape(-1))
+        self._timestamp_ns = 0
+        self._effect = ''
+
+    @classmethod
+    def from_pixels(cls, pixels):
+        # Wraps an existing contiguous (N, 3) uint8 array without copying it
+        frame = cls(0)
+        frame._pixels = pixels
+        frame._buffer = memoryview(pixels.reshape(-1))
+        return frame
+
+    def __len__(self):
+        return len(self._pixels)
+
+    def count(self):
+        return len(self._pixels)
+
+    def byte_count(self):
+        return self._pixels.nbytes
+
+    def pixels(self):
+        return self._pixels
+
+    def buffer(self):
+        return self._buffer
+
+    def timestamp(self):
+        # Wall clock presentation time in ns, set by whoever produced the frame
+        return self._timestamp_ns
+
+    def set_timestamp(self, timestamp_ns):
+        self._timestamp_ns = timestamp_ns
+
+    def view(self, first, count):
+        # A frame over a run of this one's pixels, sharing memory and the timestamp
+        view = Frame.from_pixels(self._pixels[first:first + count])
+        view.set_timestamp(self._timestamp_ns)
+        view.set_effect(self._effect)
+        return view
+
+    def effect(self):
+        # Name of the effect that drew the frame, empty if nobody said
+        return self._effect
+
+    def set_effect(self, effect):
+        self._effect = effect
+
+    def clear(self):
+        self._pixels.fill(0)
+
+    def fill(self, color):
+        self._pixels[:] = color
+
+    def copy_from(self, other):
+        np.copyto(self._pixels, other.pixels())
+
+
+def frame_buffer(frame):
+    # Sinks accept either a Frame or any bytes-like object
+    if isinstance(frame, Frame):
+        return frame.buffer()
+    return frame
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import time
+
+# What to do when a frame starts after its deadline
+LATE_SKIP = 'skip'
+LATE_CATCH_UP = 'catch_up'
+LATE_STRETCH = 'stretch'
+LATE_POLICIES = (LATE_SKIP, LATE_CATCH_UP, LATE_STRETCH)
+
+NS_PER_S = 1000000000
+
+
+class FrameClock():
+    def __init__(self, fps, late_policy=LATE_SKIP):
+        if late_policy not in LATE_POLICIES:
+            raise ValueError("Unknown late frame policy: {}".format(late_policy))
+        self._period_ns = int(round(NS_PER_S / fps))
+        self._late_policy = late_policy
+        self._start_ns = None
+        self._frame_index = 0
+        self._late_frames = 0
+        self._skipped_frames = 0
+
+    def start(self):
+        self._start_ns = time.monotonic_ns()
+        self._frame_index = 0
+
+    def wait(self):
+        # Sleep until frame k's deadline at start + k * period, returns (presentation time, slack) in seconds
+        if self._start_ns is None:
+            self.start()
+
+        deadline_ns = self._start_ns + self._frame_index * self._period_ns
+        slack_ns = deadline_ns - time.monotonic_ns()
+        if slack_ns > 0:
+            time.sleep(slack_ns / NS_PER_S)
+        elif slack_ns < 0:
+            self._late_frames += 1
+            if self._late_policy == LATE_SKIP:
+                # Jump to the frame that should be on screen now and drop the ones in between
+                missed = -slack_ns // self._period_ns
+                self._frame_index += missed
+                self._skipped_frames += missed
+            elif self._late_policy == LATE_STRETCH:
+                # Push the whole timeline back so this frame is on time
+                self._start_ns -= slack_ns
+            # Catching up keeps the schedule, so late frames run back to back until they are on time
+
+        presentation_time = self._frame_index * self._period_ns / NS_PER_S
+        self._frame_index += 1
+        return (presentation_time, slack_ns / NS_PER_S)
+
+    def period(self):
+        return self._period_ns / NS_PER_S
+
+    def late_frames(self):
+        return self._late_frames
+
+    def skipped_frames(self):
+        return self._skipped_frames
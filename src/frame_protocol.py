@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b'PXFR'
+ACK_MAGIC = b'PXAK'
+VERSION = 2
+
+PIXEL_FORMAT_RGB = 0
+BYTES_PER_PIXEL = {PIXEL_FORMAT_RGB: 3}
+
+# magic, version, pixel format, flags, sequence, pixel offset, pixel count, payload length, presentation time ns,
+# then playout delay ns, extra time the receiver waits on top of its own delay so controllers on faster links keep pace
+HEADER = struct.Struct('<4sBBHIIIIQQ')
+# magic, sequence
+ACK = struct.Struct('<4sI')
+# Delta payloads are a run of (start pixel, pixel count) ranges, each followed by its pixels
+DELTA_RANGE = struct.Struct('<II')
+
+FLAG_DELTA = 0x0001
+
+DEFAULT_KEYFRAME_INTERVAL = 30
+# A range header costs about as much as a few pixels, so nearby changes are merged
+DELTA_MERGE_GAP = 3
+
+SEQUENCE_MASK = 0xFFFFFFFF
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class FrameHeader():
+    def __init__(self, sequence, pixel_offset, pixel_count, payload_length, timestamp_ns,
+                 pixel_format=PIXEL_FORMAT_RGB, flags=0, version=VERSION, playout_delay_ns=0):
+        self.sequence = sequence
+        self.pixel_offset = pixel_offset
+        self.pixel_count = pixel_count
+        self.payload_length = payload_length
+        self.timestamp_ns = timestamp_ns
+        self.pixel_format = pixel_format
+        self.flags = flags
+        self.version = version
+        self.playout_delay_ns = playout_delay_ns
+
+    def pack(self):
+        return HEADER.pack(MAGIC, self.version, self.pixel_format, self.flags, self.sequence & SEQUENCE_MASK,
+                           self.pixel_offset, self.pixel_count, self.payload_length, self.timestamp_ns,
+                           self.playout_delay_ns)
+
+    @classmethod
+    def unpack(cls, data):
+        (magic, version, pixel_format, flags, sequence, pixel_offset, pixel_count, payload_length, timestamp_ns,
+         playout_delay_ns) = HEADER.unpack(data)
+        if magic != MAGIC:
+            raise ProtocolError("Bad frame magic")
+        if version != VERSION:
+            raise ProtocolError("Unsupported frame version: {}".format(version))
+        if pixel_format not in BYTES_PER_PIXEL:
+            raise ProtocolError("Unsupported pixel format: {}".format(pixel_format))
+        return cls(sequence, pixel_offset, pixel_count, payload_length, timestamp_ns, pixel_format, flags, version,
+                   playout_delay_ns)
+
+
+def pack_ack(sequence):
+    return ACK.pack(ACK_MAGIC, sequence & SEQUENCE_MASK)
+
+
+def unpack_ack(data):
+    magic, sequence = ACK.unpack(data)
+    if magic != ACK_MAGIC:
+        raise ProtocolError("Bad ack magic")
+    return sequence
+
+
+def send_buffers(sock, buffers):
+    # Gather the header and payload into one send without joining them
+    buffers = [memoryview(buffer).cast('B') for buffer in buffers]
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        if buffers:
+            buffers[0] = buffers[0][sent:]
+
+
+def read_into(rfile, view):
+    # Fill the whole view, returns False if the stream closed first
+    filled = 0
+    while filled < len(view):
+        read = rfile.readinto(view[filled:])
+        if not read:
+            return False
+        filled += read
+    return True
+
+
+class FrameReader():
+    def __init__(self, rfile, max_payload):
+        self._rfile = rfile
+        self._header = bytearray(HEADER.size)
+        self._header_view = memoryview(self._header)
+        self._payload = bytearray(max_payload)
+        self._payload_view = memoryview(self._payload)
+        self._resyncs = 0
+
+    def resyncs(self):
+        return self._resyncs
+
+    def read_frame(self, prefix=b''):
+        # Returns (header, payload view) or None once the stream closes
+        self._header[:len(prefix)] = prefix
+        if not read_into(self._rfile, self._header_view[len(prefix):]):
+            return None
+        if self._header[:len(MAGIC)] != MAGIC and not self._resync():
+            return None
+
+        header = FrameHeader.unpack(self._header)
+        if header.payload_length > len(self._payload):
+            raise ProtocolError("Frame payload too large: {}".format(header.payload_length))
+        payload = self._payload_view[:header.payload_length]
+        if not read_into(self._rfile, payload):
+            return None
+        return (header, payload)
+
+    def _resync(self):
+        # Slide forward a byte at a time until the magic lines up again
+        self._resyncs += 1
+        window = bytearray(self._header)
+        start = 1
+        while True:
+            index = window.find(MAGIC, start)
+            if index >= 0:
+                window = window[index:]
+                break
+            window = window[-(len(MAGIC) - 1):]
+            more = self._rfile.read(1)
+            if not more:
+                return False
+            window.extend(more)
+            start = 0
+
+        self._header[:len(window)] = window
+        return read_into(self._rfile, self._header_view[len(window):])
+
+
+class DeltaEncoder():
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self._keyframe_interval = keyframe_interval
+        self._reference = None
+        self._frames_since_keyframe = 0
+        self._payload = bytearray()
+
+    def reset(self):
+        self._reference = None
+
+    def encode(self, pixels):
+        # Returns (flags, payload), a delta against the previous frame or a full keyframe
+        if self._reference is None or self._reference.shape != pixels.shape or \
+                self._frames_since_keyframe >= self._keyframe_interval:
+            return self._keyframe(pixels)
+
+        changed = np.flatnonzero(np.any(pixels != self._reference, axis=1))
+        if len(changed) > 0:
+            breaks = np.flatnonzero(np.diff(changed) > DELTA_MERGE_GAP)
+            starts = changed[np.concatenate(([0], breaks + 1))]
+            stops = changed[np.concatenate((breaks, [len(changed) - 1]))] + 1
+        else:
+            starts = stops = changed
+
+        payload_length = len(starts) * DELTA_RANGE.size + int((stops - starts).sum()) * 3
+        if payload_length >= pixels.nbytes:
+            return self._keyframe(pixels)
+
+        self._payload[:] = b''
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            self._payload += DELTA_RANGE.pack(start, stop - start)
+            self._payload += pixels[start:stop].data
+            self._reference[start:stop] = pixels[start:stop]
+        self._frames_since_keyframe += 1
+        return (FLAG_DELTA, self._payload)
+
+    def _keyframe(self, pixels):
+        self._reference = pixels.copy()
+        self._frames_since_keyframe = 0
+        return (0, memoryview(pixels.reshape(-1)))
+
+
+def apply_delta(frame, payload):
+    # Copy each changed range of a delta payload into the frame bytes in place
+    position = 0
+    while position < len(payload):
+        start, count = DELTA_RANGE.unpack_from(payload, position)
+        position += DELTA_RANGE.size
+        byte_start = start * 3
+        byte_stop = byte_start + count * 3
+        if byte_stop > len(frame) or position + count * 3 > len(payload):
+            raise ProtocolError("Delta range outside of frame")
+        frame[byte_start:byte_stop] = payload[position:position + count * 3]
+        position += count * 3
+
+
+class SequenceTracker():
+    def __init__(self):
+        self._last_sequence = None
+        self._frames = 0
+        self._dropped = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def update(self, sequence, timestamp_ns):
+        if self._last_sequence is not None:
+            gap = (sequence - self._last_sequence - 1) & SEQUENCE_MASK
+            if gap < SEQUENCE_MASK // 2:
+                self._dropped += gap
+        self._last_sequence = sequence
+        self._frames += 1
+
+        # Only meaningful when both ends keep their wall clocks in sync
+        if timestamp_ns:
+            latency = (time.time_ns() - timestamp_ns) / 1e9
+            self._latency_sum += latency
+            self._latency_max = max(self._latency_max, latency)
+
+    def frames(self):
+        return self._frames
+
+    def dropped(self):
+        return self._dropped
+
+    def summary(self):
+        mean_latency = self._latency_sum / self._frames if self._frames else 0.0
+        return "{} frames, {} dropped, latency mean {:.1f}ms max {:.1f}ms".format(
+            self._frames, self._dropped, mean_latency * 1000, self._latency_max * 1000)
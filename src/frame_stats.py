@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+STAGES = ('animate', 'output', 'send', 'slack')
+PERCENTILES = (50, 95, 99)
+DEFAULT_WINDOW = 900
+DEFAULT_DUMP_INTERVAL = 60
+
+
+class FrameStats():
+    def __init__(self, frame_budget, window=DEFAULT_WINDOW, dump_interval=None, dump_path=None):
+        self._frame_budget = frame_budget
+        self._window = window
+        self._dump_interval = dump_interval
+        self._dump_path = dump_path
+        self._last_dump = time.monotonic()
+
+        # Per effect rolling windows of stage timings in seconds
+        self._samples = {}
+        self._frame_counts = {}
+        self._missed_counts = {}
+
+    @classmethod
+    def from_env(cls, frame_budget):
+        # PIXEL_FRAME_STATS is either "log" to print or a path to write JSON to
+        target = os.getenv('PIXEL_FRAME_STATS')
+        if not target:
+            return None
+        interval = float(os.getenv('PIXEL_FRAME_STATS_INTERVAL', DEFAULT_DUMP_INTERVAL))
+        dump_path = None if target == 'log' else target
+        return cls(frame_budget, dump_interval=interval, dump_path=dump_path)
+
+    def record_frame(self, effect_name, timings):
+        if effect_name not in self._samples:
+            self._samples[effect_name] = {stage: deque(maxlen=self._window) for stage in STAGES}
+            self._frame_counts[effect_name] = 0
+            self._missed_counts[effect_name] = 0
+
+        samples = self._samples[effect_name]
+        for stage, value in timings.items():
+            samples[stage].append(value)
+
+        # Negative slack means the previous frame overran its deadline
+        self._frame_counts[effect_name] += 1
+        if timings.get('slack', 0.0) < 0:
+            self._missed_counts[effect_name] += 1
+
+        if self._dump_interval and time.monotonic() - self._last_dump >= self._dump_interval:
+            self.dump()
+
+    def summary(self):
+        summary = {}
+        for effect_name, samples in self._samples.items():
+            effect_summary = {
+                'frames': self._frame_counts[effect_name],
+                'missed_deadlines': self._missed_counts[effect_name],
+                'frame_budget_ms': self._frame_budget * 1000,
+            }
+            for stage, values in samples.items():
+                if not values:
+                    continue
+                values_ms = np.fromiter(values, dtype=np.float64) * 1000
+                stage_summary = {'p{}'.format(p): float(v) for p, v in zip(PERCENTILES, np.percentile(values_ms, PERCENTILES))}
+                stage_summary['max'] = float(values_ms.max())
+                effect_summary[stage] = stage_summary
+            summary[effect_name] = effect_summary
+        return summary
+
+    def dump(self):
+        self._last_dump = time.monotonic()
+        summary = self.summary()
+        if self._dump_path:
+            with open(self._dump_path, 'w') as stats_file:
+                json.dump(summary, stats_file, indent=2)
+            return
+
+        for effect_name, effect_summary in summary.items():
+            stages = ' '.join([
+                '{}: {:.2f}/{:.2f}/{:.2f}ms'.format(stage, *[effect_summary[stage]['p{}'.format(p)] for p in PERCENTILES])
+                for stage in STAGES if stage in effect_summary
+            ])
+            print("Frame stats {} ({} frames, {} missed) {}".format(
+                effect_name, effect_summary['frames'], effect_summary['missed_deadlines'], stages))
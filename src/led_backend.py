@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import ctypes
+import time
+
+import numpy as np
+
+try:
+    import _rpi_ws281x as ws
+except ImportError:
+    ws = None
+
+BACKEND_WS281X = 'ws281x'
+BACKEND_FAKE = 'fake'
+BACKENDS = (BACKEND_WS281X, BACKEND_FAKE)
+
+DEFAULT_GPIO = 18
+LED_FREQUENCY = 800000
+LED_DMA = 10
+# The ws2811 struct has two channels, each driven from its own PWM output
+MAX_CHANNELS = 2
+# 24 bits at 800kHz per pixel plus the latch
+PIXEL_WIRE_TIME = 24 / LED_FREQUENCY
+LATCH_TIME = 0.00005
+
+
+def parse_channels(spec, pixel_count, default_gpio):
+    # "18:0-499,13:500-999" gives (gpio, first pixel, pixel count) per channel, inclusive ranges
+    if not spec:
+        return [(default_gpio, 0, pixel_count)]
+
+    channels = []
+    for entry in spec.split(','):
+        gpio, _, pixel_range = entry.strip().partition(':')
+        first, _, last = pixel_range.partition('-')
+        first = int(first)
+        last = int(last) if last else first
+        if last < first:
+            raise ValueError("Bad pixel range for GPIO {}: {}".format(gpio, pixel_range))
+        channels.append((int(gpio), first, last - first + 1))
+
+    if len(channels) > MAX_CHANNELS:
+        raise ValueError("At most {} LED channels are supported".format(MAX_CHANNELS))
+    ordered = sorted(channels, key=lambda channel: channel[1])
+    for (_, first, count), (_, next_first, _) in zip(ordered, ordered[1:]):
+        if first + count > next_first:
+            raise ValueError("LED channel pixel ranges overlap")
+    return channels
+
+
+def pack_frame(frame, out):
+    # Packs RGB bytes into 0x00RRGGBB words in place, written through a byte view of the little endian words
+    rgb = np.frombuffer(frame, dtype=np.uint8, count=len(out) * 3).reshape(-1, 3)
+    words = out.view(np.uint8).reshape(-1, 4)
+    words[:, 0] = rgb[:, 2]
+    words[:, 1] = rgb[:, 1]
+    words[:, 2] = rgb[:, 0]
+    return out
+
+
+def channels_pixel_count(channels):
+    return max(first + count for _, first, count in channels)
+
+
+class LedBackend():
+    def __init__(self, channels):
+        # Each channel shows its own slice of the frame, the whole frame is packed once
+        self._channels = channels
+        self._pixel_count = channels_pixel_count(channels)
+        self._packed = np.zeros(self._pixel_count, dtype=np.uint32)
+
+    def __len__(self):
+        return self._pixel_count
+
+    def byte_count(self):
+        return self._pixel_count * 3
+
+    def channels(self):
+        return self._channels
+
+    def wire_time(self):
+        # Channels clock out in parallel, so the longest one sets the refresh time
+        return max(count for _, _, count in self._channels) * PIXEL_WIRE_TIME + LATCH_TIME
+
+    def set_frame(self, frame):
+        pack_frame(frame, self._packed)
+        for channel_index, (_, first, count) in enumerate(self._channels):
+            self._upload(channel_index, self._packed[first:first + count])
+        return self.render()
+
+    def set_led(self, index, value):
+        for channel_index, (_, first, count) in enumerate(self._channels):
+            if first <= index < first + count:
+                self._set_channel_led(channel_index, index - first, value)
+
+    def render(self):
+        raise NotImplementedError()
+
+    def _set_channel_led(self, channel_index, index, value):
+        raise NotImplementedError()
+
+    def _upload(self, channel_index, packed):
+        raise NotImplementedError()
+
+
+class Ws281xBackend(LedBackend):
+    def __init__(self, channels):
+        if ws is None:
+            raise RuntimeError("The ws281x backend needs the rpi_ws281x bindings")
+        super().__init__(channels)
+        self._leds = ws.new_ws2811_t()
+        for channum in range(MAX_CHANNELS):
+            channel = ws.ws2811_channel_get(self._leds, channum)
+            ws.ws2811_channel_t_count_set(channel, 0)
+            ws.ws2811_channel_t_gpionum_set(channel, 0)
+            ws.ws2811_channel_t_invert_set(channel, 0)
+            ws.ws2811_channel_t_brightness_set(channel, 0)
+
+        # ws2811_init rejects a GPIO that cannot drive its channel, e.g. 13 or 19 for channel 0
+        self._ws_channels = []
+        for channum, (gpio, _, count) in enumerate(self._channels):
+            channel = ws.ws2811_channel_get(self._leds, channum)
+            ws.ws2811_channel_t_count_set(channel, count)
+            ws.ws2811_channel_t_gpionum_set(channel, gpio)
+            ws.ws2811_channel_t_invert_set(channel, 0)
+            ws.ws2811_channel_t_brightness_set(channel, 255)
+            self._ws_channels.append(channel)
+
+        ws.ws2811_t_freq_set(self._leds, LED_FREQUENCY)
+        ws.ws2811_t_dmanum_set(self._leds, LED_DMA)
+
+        resp = ws.ws2811_init(self._leds)
+        if resp != ws.WS2811_SUCCESS:
+            raise RuntimeError("Failed to init LEDs")
+
+        # The led arrays are allocated by ws2811_init, so their addresses are only known afterwards
+        self._led_addresses = [int(ws.ws2811_channel_t_leds_get(channel)) for channel in self._ws_channels]
+
+    def __del__(self):
+        ws.ws2811_fini(self._leds)
+        ws.delete_ws2811_t(self._leds)
+
+    def render(self):
+        resp = ws.ws2811_render(self._leds)
+        ws.ws2811_wait(self._leds)
+        return resp == ws.WS2811_SUCCESS
+
+    def _set_channel_led(self, channel_index, index, value):
+        ws.ws2811_led_set(self._ws_channels[channel_index], index, value)
+
+    def _upload(self, channel_index, packed):
+        ctypes.memmove(self._led_addresses[channel_index], packed.ctypes.data, packed.nbytes)
+
+
+class FakeBackend(LedBackend):
+    def __init__(self, channels, simulate_wire=False):
+        # Stands in for the channels' led arrays so the upload path can run off the Pi
+        super().__init__(channels)
+        self._channel_leds = [np.zeros(count, dtype=np.uint32) for _, _, count in channels]
+        self._simulate_wire = simulate_wire
+        self._renders = 0
+
+    def leds(self):
+        # The channels put back together in frame order, pixels no channel covers stay zero
+        leds = np.zeros(self._pixel_count, dtype=np.uint32)
+        for channel_leds, (_, first, count) in zip(self._channel_leds, self._channels):
+            leds[first:first + count] = channel_leds
+        return leds
+
+    def channel_leds(self, channel_index):
+        return self._channel_leds[channel_index]
+
+    def renders(self):
+        return self._renders
+
+    def render(self):
+        if self._simulate_wire:
+            time.sleep(self.wire_time())
+        self._renders += 1
+        return True
+
+    def _set_channel_led(self, channel_index, index, value):
+        self._channel_leds[channel_index][index] = value
+
+    def _upload(self, channel_index, packed):
+        leds = self._channel_leds[channel_index]
+        ctypes.memmove(leds.ctypes.data, packed.ctypes.data, packed.nbytes)
+
+
+def create_backend(name, channels, simulate_wire=False):
+    if name == BACKEND_FAKE:
+        return FakeBackend(channels, simulate_wire)
+    if name == BACKEND_WS281X:
+        return Ws281xBackend(channels)
+    raise ValueError("Unknown LED backend: {}".format(name))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from led_backend import DEFAULT_GPIO, FakeBackend, parse_channels
+from utils import env_pixel_count
+
+BENCH_FRAMES = 200
+
+
+def per_pixel_set_frame(pixels, frame):
+    # The old upload path, one shift and one set_led call per pixel
+    for index in range(len(pixels)):
+        byte_index = index * 3
+        pixels.set_led(index, frame[byte_index] << 16 | frame[byte_index + 1] << 8 | frame[byte_index + 2])
+    return pixels.render()
+
+
+def bench(set_frame, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        set_frame(frame)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    pixel_count = int(sys.argv[1]) if len(sys.argv) > 1 else env_pixel_count()
+    frame_count = int(sys.argv[2]) if len(sys.argv) > 2 else BENCH_FRAMES
+    pixels = FakeBackend(parse_channels(os.getenv('PIXEL_CHANNELS'), pixel_count, DEFAULT_GPIO))
+    frames = [os.urandom(pixels.byte_count()) for _ in range(4)] * (frame_count // 4)
+
+    per_pixel = bench(lambda frame: per_pixel_set_frame(pixels, frame), frames)
+    expected = pixels.leds().copy()
+    bulk = bench(pixels.set_frame, frames)
+    if not np.array_equal(expected, pixels.leds()):
+        raise RuntimeError("Bulk upload does not match the per pixel path")
+
+    print("{} pixels on {} channels, {} frames on the fake backend".format(len(pixels), len(pixels.channels()), len(frames)))
+    print("Per pixel: {:8.3f}ms per frame".format(per_pixel * 1000))
+    print("Bulk:      {:8.3f}ms per frame ({:.0f}x)".format(bulk * 1000, per_pixel / bulk))
+    print("Wire time: {:8.3f}ms per frame".format(pixels.wire_time() * 1000))
+
+if __name__ == "__main__":
+    main()
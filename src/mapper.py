@@ -7,9 +7,10 @@ import socket
 import time
 
 from client import Client
+from utils import env_pixel_count
 
 EXPECTED_CAMERA_INDEX = 0
-PIXEL_COUNT = 1000
+PIXEL_COUNT = env_pixel_count()
 MESSAGE_OFF = bytes.fromhex("00" * 3 * PIXEL_COUNT)
 MESSAGE_ON = bytes.fromhex("FF" * 3 * PIXEL_COUNT)
 
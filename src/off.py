@@ -3,8 +3,9 @@
 import time
 
 from client import  Client
+from utils import env_pixel_count
 
-PIXEL_COUNT = 1000
+PIXEL_COUNT = env_pixel_count()
 BYTE_COUNT = PIXEL_COUNT * 3
 MESSAGE_OFF = bytes.fromhex("00") * BYTE_COUNT
 MESSAGE_ON = bytes.fromhex("FF") * BYTE_COUNT
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import os
+
+import numpy as np
+
+from frame import Frame
+
+CHANNEL_NAMES = 'RGB'
+LEVEL_COUNT = 256
+
+
+class OutputStage():
+    def __init__(self, brightness=1.0, gamma=1.0, color_order='RGB'):
+        self._fade = 1.0
+        self._brightness = 1.0
+        self._gamma = (1.0, 1.0, 1.0)
+        self._order = np.arange(3)
+        self._identity_order = True
+        self._frame = None
+
+        # One 256 entry table per output channel, laid out end to end for a single gather
+        self._lut = np.empty(3 * LEVEL_COUNT, dtype=np.uint8)
+        self._lut_offsets = np.arange(3, dtype=np.uint16) * LEVEL_COUNT
+        self._lut_dirty = True
+
+        self.set_brightness(brightness)
+        self.set_gamma(gamma)
+        self.set_color_order(color_order)
+
+    @classmethod
+    def from_env(cls):
+        brightness = float(os.getenv('PIXEL_BRIGHTNESS', '1.0'))
+        gamma = [float(value) for value in os.getenv('PIXEL_GAMMA', '1.0').split(',')]
+        color_order = os.getenv('PIXEL_COLOR_ORDER', 'RGB')
+        return cls(brightness, gamma[0] if len(gamma) == 1 else gamma, color_order)
+
+    def set_fade(self, fade):
+        fade = min(max(float(fade), 0.0), 1.0)
+        if fade != self._fade:
+            self._fade = fade
+            self._lut_dirty = True
+
+    def set_brightness(self, brightness):
+        brightness = min(max(float(brightness), 0.0), 1.0)
+        if brightness != self._brightness:
+            self._brightness = brightness
+            self._lut_dirty = True
+
+    def set_gamma(self, gamma):
+        if np.isscalar(gamma):
+            gamma = (gamma, gamma, gamma)
+        gamma = tuple(float(value) for value in gamma)
+        if len(gamma) != 3:
+            raise ValueError("Gamma needs one value or one per channel")
+        if gamma != self._gamma:
+            self._gamma = gamma
+            self._lut_dirty = True
+
+    def set_color_order(self, color_order):
+        color_order = color_order.upper()
+        if sorted(color_order) != sorted(CHANNEL_NAMES):
+            raise ValueError("Invalid color order: {}".format(color_order))
+        order = np.array([CHANNEL_NAMES.index(channel) for channel in color_order])
+        if not np.array_equal(order, self._order):
+            self._order = order
+            self._identity_order = color_order == CHANNEL_NAMES
+            self._lut_dirty = True
+
+    def _build_lut(self):
+        levels = np.arange(LEVEL_COUNT) / (LEVEL_COUNT - 1.0)
+        scale = (LEVEL_COUNT - 1.0) * self._brightness * self._fade
+        for channel, source in enumerate(self._order):
+            table = np.power(levels, self._gamma[source]) * scale
+            start = channel * LEVEL_COUNT
+            self._lut[start:start + LEVEL_COUNT] = np.floor(table + 0.5)
+        self._lut_dirty = False
+
+    def _allocate(self, pixel_count):
+        self._frame = Frame(pixel_count)
+        self._ordered = np.empty((pixel_count, 3), dtype=np.uint8)
+        self._indices = np.empty((pixel_count, 3), dtype=np.uint16)
+
+    def apply(self, frame):
+        if self._frame is None or self._frame.count() != frame.count():
+            self._allocate(frame.count())
+        if self._lut_dirty:
+            self._build_lut()
+
+        # Reorder channels, offset each into its own table then gather through the LUT
+        source = frame.pixels()
+        if not self._identity_order:
+            np.take(source, self._order, axis=1, out=self._ordered, mode='clip')
+            source = self._ordered
+        np.add(source, self._lut_offsets, out=self._indices)
+        np.take(self._lut, self._indices, out=self._frame.pixels(), mode='clip')
+        return self._frame
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from client import Client
+from frame import Frame, frame_buffer
+from shm_client import ShmClient
+from sim_client import SimClient
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b'PXRC'
+VERSION = 1
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZSTD = 'zstd'
+COMPRESSION_LZ4 = 'lz4'
+COMPRESSION_IDS = {COMPRESSION_NONE: 0, COMPRESSION_ZSTD: 1, COMPRESSION_LZ4: 2}
+
+# magic, version, compression, pixel count, frames per chunk
+FILE_HEADER = struct.Struct('<4sHHII')
+EFFECT_NAME_SIZE = 24
+# timestamp ns, effect name, then the frame's pixels
+RECORD_HEADER = struct.Struct('<Q{}s'.format(EFFECT_NAME_SIZE))
+# compressed length, record count, only present in compressed files
+CHUNK_HEADER = struct.Struct('<II')
+
+DEFAULT_CHUNK_FRAMES = 64
+
+
+def compression_codec(compression):
+    # Returns (compress, decompress) for a compression name
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        return (zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress)
+    if compression == COMPRESSION_LZ4:
+        if lz4 is None:
+            raise RuntimeError("LZ4 compression needs the lz4 package")
+        return (lz4.frame.compress, lz4.frame.decompress)
+    if compression == COMPRESSION_NONE:
+        return (None, None)
+    raise ValueError("Unknown compression: {}".format(compression))
+
+
+def record_size(pixel_count):
+    return RECORD_HEADER.size + pixel_count * 3
+
+
+class FrameRecorder():
+    def __init__(self, path, compression=None, chunk_frames=DEFAULT_CHUNK_FRAMES):
+        # The file is opened on the first frame, which also fixes the pixel count
+        self._path = path
+        self._compression = compression if compression else os.getenv('PIXEL_RECORD_COMPRESSION', COMPRESSION_NONE)
+        self._compress = compression_codec(self._compression)[0]
+        self._chunk_frames = chunk_frames
+        self._file = None
+        self._chunk = None
+        self._chunk_count = 0
+        self._frames = 0
+        self._bytes_written = 0
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._flush()
+        self._file.close()
+        self._file = None
+
+    def frames(self):
+        return self._frames
+
+    def bytes_written(self):
+        return self._bytes_written
+
+    def send_frame(self, frame):
+        data = frame_buffer(frame)
+        if self._file is None:
+            self._open(len(data) // 3)
+        if len(data) != self._pixel_count * 3:
+            raise ValueError("Frame of {} bytes does not match the {} pixel recording".format(len(data), self._pixel_count))
+
+        if isinstance(frame, Frame):
+            timestamp_ns, effect = frame.timestamp(), frame.effect()
+        else:
+            timestamp_ns, effect = time.time_ns(), ''
+
+        offset = self._chunk_count * self._record_size
+        RECORD_HEADER.pack_into(self._chunk, offset, timestamp_ns, effect.encode('utf-8')[:EFFECT_NAME_SIZE])
+        self._chunk[offset + RECORD_HEADER.size:offset + self._record_size] = data
+        self._chunk_count += 1
+        self._frames += 1
+        if self._chunk_count == self._chunk_frames:
+            self._flush()
+        return len(data)
+
+    def _open(self, pixel_count):
+        self._pixel_count = pixel_count
+        self._record_size = record_size(pixel_count)
+        self._chunk = bytearray(self._record_size * self._chunk_frames)
+        self._chunk_view = memoryview(self._chunk)
+        self._file = open(self._path, 'wb')
+        header = FILE_HEADER.pack(MAGIC, VERSION, COMPRESSION_IDS[self._compression], pixel_count, self._chunk_frames)
+        self._file.write(header)
+        self._bytes_written += len(header)
+
+    def _flush(self):
+        if self._chunk_count == 0:
+            return
+        records = self._chunk_view[:self._chunk_count * self._record_size]
+        if self._compress:
+            compressed = self._compress(records)
+            self._file.write(CHUNK_HEADER.pack(len(compressed), self._chunk_count))
+            self._file.write(compressed)
+            self._bytes_written += CHUNK_HEADER.size + len(compressed)
+        else:
+            self._file.write(records)
+            self._bytes_written += len(records)
+        # Hand every chunk to the OS so a killed recording only loses the chunk still being filled
+        self._file.flush()
+        self._chunk_count = 0
+
+
+class FramePlayer():
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, version, compression_id, self._pixel_count, self._chunk_frames = FILE_HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise ValueError("Not a frame recording: {}".format(path))
+        if version != VERSION:
+            raise ValueError("Unsupported recording version: {}".format(version))
+        compressions = {value: name for name, value in COMPRESSION_IDS.items()}
+        self._compression = compressions[compression_id]
+        self._decompress = compression_codec(self._compression)[1]
+        self._record_size = record_size(self._pixel_count)
+
+        # Uncompressed records are read straight out of the map, compressed ones a chunk at a time
+        self._chunks = []
+        if self._decompress:
+            offset = FILE_HEADER.size
+            while offset + CHUNK_HEADER.size <= len(self._view):
+                length, count = CHUNK_HEADER.unpack_from(self._view, offset)
+                self._chunks.append((offset + CHUNK_HEADER.size, length, count))
+                offset += CHUNK_HEADER.size + length
+            self._frame_count = sum(count for _, _, count in self._chunks)
+        else:
+            self._frame_count = (len(self._view) - FILE_HEADER.size) // self._record_size
+        self._chunk_index = None
+        self._chunk_records = None
+
+    def close(self):
+        self._chunk_records = None
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def pixel_count(self):
+        return self._pixel_count
+
+    def frame_count(self):
+        return self._frame_count
+
+    def compression(self):
+        return self._compression
+
+    def record(self, index):
+        # Returns (timestamp ns, effect name, pixel bytes) without copying the pixels
+        if self._decompress:
+            chunk_index, record_index = divmod(index, self._chunk_frames)
+            if chunk_index != self._chunk_index:
+                start, length, _ = self._chunks[chunk_index]
+                self._chunk_records = memoryview(self._decompress(self._view[start:start + length]))
+                self._chunk_index = chunk_index
+            records, offset = self._chunk_records, record_index * self._record_size
+        else:
+            records, offset = self._view, FILE_HEADER.size + index * self._record_size
+
+        timestamp_ns, effect = RECORD_HEADER.unpack_from(records, offset)
+        pixels = records[offset + RECORD_HEADER.size:offset + self._record_size]
+        return (timestamp_ns, effect.rstrip(b'\x00').decode('utf-8', 'ignore'), pixels)
+
+    def play(self, sink, rate=1.0, loop=False):
+        # Sends every frame at its recorded spacing divided by rate, a rate of 0 sends as fast as the sink takes them
+        while True:
+            start_ns = None
+            for index in range(self._frame_count):
+                timestamp_ns, effect, pixels = self.record(index)
+                if start_ns is None:
+                    start_ns, play_start = timestamp_ns, time.monotonic()
+                if rate > 0:
+                    wait = play_start + (timestamp_ns - start_ns) / 1e9 / rate - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+
+                frame = Frame.from_pixels(np.frombuffer(pixels, dtype=np.uint8).reshape(-1, 3))
+                frame.set_timestamp(time.time_ns())
+                frame.set_effect(effect)
+                sink.send_frame(frame)
+            if not loop:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a frame recording to a pixel sink")
+    parser.add_argument('path')
+    parser.add_argument('--rate', type=float, default=1.0, help="Playback speed, 0 plays as fast as possible")
+    parser.add_argument('--sink', default='client', choices=('client', 'sim', 'shm'))
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--info', action='store_true', help="Only print what is in the recording")
+    args = parser.parse_args()
+
+    player = FramePlayer(args.path)
+    print("{} frames of {} pixels, {} compression".format(player.frame_count(), player.pixel_count(), player.compression()))
+    if args.info:
+        return
+
+    if args.sink == 'sim':
+        sink = SimClient('./tree_sim.sock')
+    elif args.sink == 'shm':
+        sink = ShmClient()
+    else:
+        sink = Client(False)
+    player.play(sink, args.rate, args.loop)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import resource
+import time
+
+import numpy as np
+
+from coordinator import load_effect_classes
+from output_stage import OutputStage
+from recorder import COMPRESSION_IDS, COMPRESSION_NONE, FrameRecorder
+from utils import PixelMap
+
+RENDER_FPS = 30
+RENDER_SECONDS = 10
+
+
+def find_effect_class(effect_classes, name):
+    # Takes the class name or the module name, e.g. PlaneWaveEffect or plane_wave
+    class_name = name if name in effect_classes else name.title().replace('_', '') + 'Effect'
+    if class_name not in effect_classes:
+        raise SystemExit("Unknown effect {}, pick one of: {}".format(name, ", ".join(sorted(effect_classes))))
+    return effect_classes[class_name]
+
+
+def peak_memory_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def render(effect, frame_count, delta_t, sink=None, output_stage=None):
+    # Drives the effect back to back with a fixed delta_t, returns the time each animate_base call took
+    frame_times = np.zeros(frame_count)
+    start_ns = time.time_ns()
+    for index in range(frame_count):
+        frame_start = time.perf_counter()
+        frame = effect.animate_base(delta_t)
+        frame_times[index] = time.perf_counter() - frame_start
+
+        if sink:
+            output_stage.set_fade(effect.fade_level())
+            frame = output_stage.apply(frame)
+            frame.set_timestamp(start_ns + int(index * delta_t * 1e9))
+            frame.set_effect(type(effect).__name__)
+            sink.send_frame(frame)
+    return frame_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render an effect as fast as possible without a live sink")
+    parser.add_argument('effect', help="Effect class or module name, e.g. PlaneWaveEffect or plane_wave")
+    parser.add_argument('--map', default=os.getenv('PIXEL_MAP_CSV'), help="Pixel map CSV, defaults to PIXEL_MAP_CSV")
+    parser.add_argument('--seconds', type=float, default=RENDER_SECONDS, help="Effect time to render")
+    parser.add_argument('--fps', type=float, default=RENDER_FPS, help="Sets the fixed delta_t")
+    parser.add_argument('--output', help="Record the frames here, they are discarded otherwise")
+    parser.add_argument('--compression', default=COMPRESSION_NONE, choices=tuple(COMPRESSION_IDS))
+    args = parser.parse_args()
+
+    effect_class = find_effect_class(load_effect_classes(), args.effect)
+    pixel_map = PixelMap.from_csv(args.map)
+    delta_t = 1 / args.fps
+    frame_count = int(args.seconds * args.fps)
+
+    setup_start = time.perf_counter()
+    effect = effect_class(pixel_map)
+    setup_time = time.perf_counter() - setup_start
+    # A fade as long as one frame puts the effect at full level from the first frame
+    effect.fade_in(delta_t)
+    setup_memory = peak_memory_mb()
+
+    sink = FrameRecorder(args.output, args.compression) if args.output else None
+    render_start = time.perf_counter()
+    frame_times = render(effect, frame_count, delta_t, sink, OutputStage.from_env())
+    render_time = time.perf_counter() - render_start
+    if sink:
+        sink.close()
+
+    p50, p95, p99 = np.percentile(frame_times, [50, 95, 99]) * 1000
+    print("{} on {} pixels, {} frames at delta_t {:.4f}s".format(effect_class.__name__, len(pixel_map), frame_count, delta_t))
+    print("Setup: {:.1f}ms".format(setup_time * 1000))
+    print("Throughput: {:.1f} fps ({:.1f} fps animate only)".format(frame_count / render_time, frame_count / frame_times.sum()))
+    print("Frame time: p50 {:.3f}ms p95 {:.3f}ms p99 {:.3f}ms max {:.3f}ms".format(p50, p95, p99, frame_times.max() * 1000))
+    print("Peak memory: {:.1f}MB ({:.1f}MB after setup)".format(peak_memory_mb(), setup_memory))
+    if sink:
+        print("Wrote {} frames, {} bytes to {}".format(sink.frames(), sink.bytes_written(), args.output))
+
+if __name__ == "__main__":
+    main()
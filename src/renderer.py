@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+DEFAULT_INTERPOLATION_DELAY = 0.15
+DEFAULT_KEYFRAME_RATE = 30
+# Keyframes kept beyond the ones the delay spans, one to blend towards plus room for jitter
+KEYFRAME_HEADROOM = 3
+CLOCK_OFFSET_WINDOW = 64
+
+
+class Renderer():
+    def __init__(self, pixels):
+        # The receive side fills the back buffer, the render thread only ever shows the newest complete frame
+        self._pixels = pixels
+        self._back = bytearray(pixels.byte_count())
+        self._pending = bytearray(pixels.byte_count())
+        self._front = bytearray(pixels.byte_count())
+        self._has_pending = False
+        self._closing = False
+        self._condition = threading.Condition()
+        self._received = 0
+        self._rendered = 0
+        self._dropped = 0
+        self._failed = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._thread.join()
+
+    def submit(self, frame, timestamp_ns=None, playout_delay_ns=0):
+        # Copy into the back buffer and swap it in, a frame still waiting to be shown is superseded
+        length = min(len(frame), len(self._back))
+        self._back[:length] = memoryview(frame)[:length]
+        with self._condition:
+            self._back, self._pending = self._pending, self._back
+            if self._has_pending:
+                self._dropped += 1
+            self._has_pending = True
+            self._received += 1
+            self._condition.notify()
+
+    def byte_count(self):
+        return self._pixels.byte_count()
+
+    def received(self):
+        return self._received
+
+    def rendered(self):
+        return self._rendered
+
+    def dropped(self):
+        return self._dropped
+
+    def summary(self):
+        return "{} received, {} rendered, {} superseded, {} render failures".format(
+            self._received, self._rendered, self._dropped, self._failed)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._has_pending and not self._closing:
+                    self._condition.wait()
+                if self._closing:
+                    return
+                self._front, self._pending = self._pending, self._front
+                self._has_pending = False
+
+            # Render and wait for the DMA outside the lock so receiving carries on meanwhile
+            if not self._pixels.set_frame(self._front):
+                self._failed += 1
+            self._rendered += 1
+
+
+class ClockOffset():
+    def __init__(self, window=CLOCK_OFFSET_WINDOW):
+        # Local arrival minus remote timestamp, the smallest recent sample is the one with the least network delay
+        self._samples = deque(maxlen=window)
+
+    def reset(self):
+        self._samples.clear()
+
+    def update(self, remote_ns, local_ns):
+        self._samples.append(local_ns - remote_ns)
+
+    def offset(self):
+        return min(self._samples) if self._samples else 0
+
+
+def keyframe_slots(delay, keyframe_rate):
+    # Enough slots to hold every keyframe sent during the delay, otherwise the playout time falls off the oldest one
+    return math.ceil(delay * keyframe_rate) + KEYFRAME_HEADROOM
+
+
+class InterpolatingRenderer():
+    def __init__(self, pixels, delay=DEFAULT_INTERPOLATION_DELAY, keyframe_rate=DEFAULT_KEYFRAME_RATE):
+        # Keyframes are shown delay seconds behind the sender so there is usually a later one to blend towards
+        self._pixels = pixels
+        self._delay_ns = int(delay * 1e9)
+        self._period = pixels.wire_time()
+        self._clock = ClockOffset()
+        self._keyframes = deque()
+        self._free = [np.zeros((len(pixels), 3), dtype=np.float32) for _ in range(keyframe_slots(delay, keyframe_rate))]
+        self._blend = np.zeros((len(pixels), 3), dtype=np.float32)
+        self._output = np.zeros((len(pixels), 3), dtype=np.uint8)
+        self._closing = False
+        self._condition = threading.Condition()
+        self._received = 0
+        self._rendered = 0
+        self._interpolated = 0
+        self._held = 0
+        self._late = 0
+        self._failed = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._thread.join()
+
+    def submit(self, frame, timestamp_ns=None, playout_delay_ns=0):
+        # Frames without a timestamp replace everything queued and show straight away
+        pixels = np.frombuffer(frame, dtype=np.uint8, count=self._output.size).reshape(-1, 3)
+        with self._condition:
+            self._received += 1
+            if timestamp_ns is None:
+                self._clock.reset()
+                self._free.extend(slot for _, slot in self._keyframes)
+                self._keyframes.clear()
+                timestamp_ns = 0
+            else:
+                # The playout delay goes on after the offset estimate, which would otherwise absorb it
+                self._clock.update(timestamp_ns, time.time_ns())
+                timestamp_ns += playout_delay_ns
+                if self._keyframes and timestamp_ns <= self._keyframes[-1][0]:
+                    self._late += 1
+                    return
+
+            slot = self._free.pop() if self._free else self._keyframes.popleft()[1]
+            np.copyto(slot, pixels)
+            self._keyframes.append((timestamp_ns, slot))
+            self._condition.notify()
+
+    def byte_count(self):
+        return self._pixels.byte_count()
+
+    def received(self):
+        return self._received
+
+    def rendered(self):
+        return self._rendered
+
+    def summary(self):
+        return "{} received, {} rendered, {} interpolated, {} held, {} out of order, {} render failures, clock offset {:.1f}ms".format(
+            self._received, self._rendered, self._interpolated, self._held, self._late, self._failed,
+            self._clock.offset() / 1e6)
+
+    def _interpolate(self, playout_ns):
+        # Blend the two keyframes either side of the playout time, or hold the nearest one
+        keyframes = self._keyframes
+        if playout_ns >= keyframes[-1][0]:
+            np.copyto(self._output, keyframes[-1][1], casting='unsafe')
+            self._held += 1
+            return
+        if playout_ns <= keyframes[0][0]:
+            np.copyto(self._output, keyframes[0][1], casting='unsafe')
+            return
+
+        index = 1
+        while keyframes[index][0] <= playout_ns:
+            index += 1
+        start_ns, start = keyframes[index - 1]
+        stop_ns, stop = keyframes[index]
+        weight = (playout_ns - start_ns) / (stop_ns - start_ns)
+        np.subtract(stop, start, out=self._blend)
+        self._blend *= weight
+        self._blend += start
+        self._blend += 0.5
+        np.copyto(self._output, self._blend, casting='unsafe')
+        self._interpolated += 1
+
+    def _run(self):
+        # Render at the strip's own refresh rate rather than whenever a frame arrives
+        next_render = time.monotonic()
+        while True:
+            with self._condition:
+                while not self._keyframes and not self._closing:
+                    self._condition.wait()
+                if self._closing:
+                    return
+                self._interpolate(time.time_ns() - self._clock.offset() - self._delay_ns)
+
+            if not self._pixels.set_frame(self._output):
+                self._failed += 1
+            self._rendered += 1
+
+            next_render += self._period
+            wait = next_render - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                next_render = time.monotonic()
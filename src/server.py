@@ -1,82 +1,184 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import socket
 import socketserver
+import struct
+import time
 
-import board
-import _rpi_ws281x as ws
+from dmx_protocol import (ARTNET_PORT, CHANNELS_PER_UNIVERSE, E131_PORT, DmxError, e131_multicast_address, parse_artnet,
+                          parse_e131, universe_count)
+from frame_protocol import FLAG_DELTA, MAGIC, FrameReader, ProtocolError, SequenceTracker, apply_delta, pack_ack
+from led_backend import BACKEND_WS281X, BACKENDS, DEFAULT_GPIO, create_backend, parse_channels
+from renderer import DEFAULT_INTERPOLATION_DELAY, DEFAULT_KEYFRAME_RATE, InterpolatingRenderer, Renderer
+from utils import env_pixel_count
 
-PIXEL_COUNT = 1000
-BYTE_COUNT = PIXEL_COUNT * 3
-OFF_FRAME = bytes.fromhex('00') * BYTE_COUNT
+SERVER_PORT = 7689
+STATS_INTERVAL = 10
+DMX_PACKET_SIZE = 1024
 
-class Pixels():
-    def __init__(self, pixel_count, pixel_gpio):
-        self._pixel_count = pixel_count
-        self._pixel_gpio = pixel_gpio
-        self._leds = ws.new_ws2811_t()
-        for channum in range(2):
-            channel = ws.ws2811_channel_get(self._leds, channum)
-            ws.ws2811_channel_t_count_set(channel, 0)
-            ws.ws2811_channel_t_gpionum_set(channel, 0)
-            ws.ws2811_channel_t_invert_set(channel, 0)
-            ws.ws2811_channel_t_brightness_set(channel, 0)
-
-        self._channel = ws.ws2811_channel_get(self._leds, 0)
-        ws.ws2811_channel_t_count_set(self._channel, self._pixel_count)
-        ws.ws2811_channel_t_gpionum_set(self._channel, self._pixel_gpio)
-        ws.ws2811_channel_t_invert_set(self._channel, 0)
-        ws.ws2811_channel_t_brightness_set(self._channel, 255)
-
-        ws.ws2811_t_freq_set(self._leds, 800000)
-        ws.ws2811_t_dmanum_set(self._leds, 10)
-
-        resp = ws.ws2811_init(self._leds)
-        if resp != ws.WS2811_SUCCESS:
-            raise RuntimeError("Failed to init LEDs")
-
-    def __del__(self):
-        ws.ws2811_fini(self._leds)
-        ws.delete_ws2811_t(self._leds)
-
-    def __len__(self):
-        return self._pixel_count
-
-    def set_led(self, index, value):
-        ws.ws2811_led_set(self._channel, index, value)
-
-    def render(self):
-        resp = ws.ws2811_render(self._leds)
-        ws.ws2811_wait(self._leds)
-        return resp == ws.WS2811_SUCCESS
-
-    def set_frame(self, frame):
-        for index in range(len(PIXELS)):
-            byte_index = index * 3
-            PIXELS.set_led(index, frame[byte_index] << 16 | frame[byte_index + 1] << 8 | frame[byte_index + 2])
-        return self.render()
-
-
-PIXELS = Pixels(PIXEL_COUNT, 18)
+MODE_TCP = 'tcp'
+MODE_SACN = 'sacn'
+MODE_ARTNET = 'artnet'
 
 class FrameHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.renderer = self.server.renderer
+        self.byte_count = self.renderer.byte_count()
+
     def handle(self):
         try:
-            frame = self.rfile.read(BYTE_COUNT)
-            while len(frame) > 0:
-                PIXELS.set_frame(frame)
-                self.wfile.write(bytes('true', 'utf-8'))
-                frame = self.rfile.read(BYTE_COUNT)
+            # Framed clients always open with the magic, anything else is a raw frame stream
+            start = self.rfile.read(len(MAGIC))
+            if start == MAGIC:
+                self.handle_framed(start)
+            else:
+                self.handle_raw(start)
         finally:
-            PIXELS.set_frame(OFF_FRAME)
+            self.renderer.submit(bytes(self.byte_count))
+            print("Renderer: {}".format(self.renderer.summary()))
+
+    def handle_raw(self, start):
+        frame = start + self.rfile.read(self.byte_count - len(start))
+        while len(frame) == self.byte_count:
+            self.renderer.submit(frame)
+            self.wfile.write(bytes('true', 'utf-8'))
+            frame = self.rfile.read(self.byte_count)
+
+    def handle_framed(self, start):
+        reader = FrameReader(self.rfile, self.byte_count)
+        tracker = SequenceTracker()
+        frame = bytearray(self.byte_count)
+        frame_view = memoryview(frame)
+        have_keyframe = False
+        last_report = time.monotonic()
+
+        try:
+            received = reader.read_frame(start)
+            while received:
+                header, payload = received
+                byte_start = header.pixel_offset * 3
+                byte_stop = byte_start + header.pixel_count * 3
+                is_delta = header.flags & FLAG_DELTA
+                if byte_stop > self.byte_count or (not is_delta and header.payload_length != header.pixel_count * 3):
+                    print("Dropping frame {} outside of {} pixels".format(header.sequence, self.byte_count // 3))
+                elif is_delta and not have_keyframe:
+                    print("Dropping delta frame {} without a keyframe".format(header.sequence))
+                else:
+                    # Deltas patch the last frame in place, everything else replaces the range
+                    if is_delta:
+                        apply_delta(frame_view[byte_start:byte_stop], payload)
+                    else:
+                        frame[byte_start:byte_stop] = payload
+                        have_keyframe = True
+                    tracker.update(header.sequence, header.timestamp_ns)
+                    self.renderer.submit(frame, header.timestamp_ns or None, header.playout_delay_ns)
+
+                # Every frame is acked, dropped ones too, so a client waiting on it or on its window never stalls.
+                # The ack goes out once the frame is handed over rather than after it is shown
+                self.wfile.write(pack_ack(header.sequence))
+
+                if time.monotonic() - last_report > STATS_INTERVAL:
+                    last_report = time.monotonic()
+                    print("Frames: {}, resyncs: {}, renderer: {}".format(
+                        tracker.summary(), reader.resyncs(), self.renderer.summary()))
+                received = reader.read_frame()
+        except ProtocolError as error:
+            print("Closing connection: {}".format(error))
+        print("Connection closed after {}".format(tracker.summary()))
+
+
+def serve_dmx(protocol, renderer):
+    if protocol == MODE_SACN:
+        port, parse, default_universe = E131_PORT, parse_e131, '1'
+    else:
+        port, parse, default_universe = ARTNET_PORT, parse_artnet, '0'
+    start_universe = int(os.getenv('PIXEL_START_UNIVERSE', default_universe))
+    byte_count = renderer.byte_count()
+    universes = universe_count(byte_count)
+    last_universe = start_universe + universes - 1
+
+    dmx_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    dmx_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    dmx_socket.bind(("0.0.0.0", port))
+    if protocol == MODE_SACN:
+        sync_universe = int(os.getenv('PIXEL_SYNC_UNIVERSE', '0'))
+        groups = list(range(start_universe, last_universe + 1)) + ([sync_universe] if sync_universe else [])
+        for universe in groups:
+            membership = struct.pack('4s4s', socket.inet_aton(e131_multicast_address(universe)), socket.inet_aton('0.0.0.0'))
+            dmx_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+
+    frame = bytearray(byte_count)
+    packet = bytearray(DMX_PACKET_SIZE)
+    packet_view = memoryview(packet)
+    synced = False
+    while True:
+        size = dmx_socket.recv_into(packet)
+        try:
+            message = parse(packet_view[:size])
+        except DmxError:
+            continue
+
+        # With sync the sender says when to show the frame, otherwise show it once the last universe lands
+        if message[0] == 'sync':
+            synced = True
+            renderer.submit(frame)
+            continue
+
+        kind, universe, sync_universe, data = message
+        if sync_universe is not None:
+            synced = sync_universe != 0
+        index = universe - start_universe
+        if index < 0 or index >= universes:
+            continue
+        offset = index * CHANNELS_PER_UNIVERSE
+        length = min(len(data), byte_count - offset)
+        frame[offset:offset + length] = data[:length]
+        if not synced and universe == last_universe:
+            renderer.submit(frame)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Receive frames and push them out to the LEDs")
+    parser.add_argument('mode', nargs='?', default=MODE_TCP, choices=(MODE_TCP, MODE_SACN, MODE_ARTNET))
+    parser.add_argument('--backend', default=BACKEND_WS281X, choices=BACKENDS)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--count', type=int, default=env_pixel_count())
+    parser.add_argument('--gpio', type=int, default=DEFAULT_GPIO)
+    parser.add_argument('--channels', default=os.getenv('PIXEL_CHANNELS'),
+                        help="GPIO and pixel range per channel, e.g. 18:0-499,13:500-999, overrides --count and --gpio")
+    parser.add_argument('--simulate-wire', action='store_true', help="Make the fake backend take as long as a real strip")
+    parser.add_argument('--interpolate', action='store_true',
+                        help="Blend between timestamped keyframes at the strip's refresh rate")
+    parser.add_argument('--interpolate-delay', type=float, default=DEFAULT_INTERPOLATION_DELAY,
+                        help="Seconds to show keyframes behind the sender, should cover a keyframe interval plus jitter")
+    parser.add_argument('--keyframe-rate', type=float, default=float(os.getenv('PIXEL_TARGET_FPS', DEFAULT_KEYFRAME_RATE)),
+                        help="Frames per second the sender renders, sizes the keyframe buffer to cover the delay")
+    return parser.parse_args()
 
 
 def main():
-    PIXELS.set_frame(OFF_FRAME)
-    with socketserver.TCPServer(("0.0.0.0", 7689), FrameHandler) as server:
-        server.serve_forever()
+    args = parse_args()
+    pixels = create_backend(args.backend, parse_channels(args.channels, args.count, args.gpio), args.simulate_wire)
+    off_frame = bytes(pixels.byte_count())
+    pixels.set_frame(off_frame)
+    if args.interpolate:
+        renderer = InterpolatingRenderer(pixels, args.interpolate_delay, args.keyframe_rate).start()
+    else:
+        renderer = Renderer(pixels).start()
+    try:
+        if args.mode != MODE_TCP:
+            serve_dmx(args.mode, renderer)
+            return
+
+        with socketserver.TCPServer(("0.0.0.0", args.port), FrameHandler) as server:
+            server.renderer = renderer
+            server.serve_forever()
+    finally:
+        renderer.close()
+        pixels.set_frame(off_frame)
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from frame import Frame, frame_buffer
+
+DEFAULT_RING_NAME = 'pixel_tools'
+DEFAULT_SLOTS = 3
+READ_RETRIES = 4
+
+# The ring starts with a 64 byte header of uint64 fields, then each slot is a 64 byte header and its payload
+RING_MAGIC = 0x50585348
+RING_HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+SLOT_ALIGN = 64
+HEADER_MAGIC = 0
+HEADER_SLOT_COUNT = 1
+HEADER_SLOT_BYTES = 2
+HEADER_LATEST = 3
+HEADER_STATE = 4
+HEADER_PID = 5
+SLOT_SEQUENCE = 0
+SLOT_LENGTH = 1
+SLOT_TIMESTAMP = 2
+
+RING_OPEN = 1
+RING_CLOSED = 2
+
+
+def ring_size(slot_count, slot_bytes):
+    return RING_HEADER_SIZE + slot_count * slot_stride(slot_bytes)
+
+
+def slot_stride(slot_bytes):
+    return SLOT_HEADER_SIZE + (slot_bytes + SLOT_ALIGN - 1) // SLOT_ALIGN * SLOT_ALIGN
+
+
+def ring_views(buffer, slot_count, slot_bytes):
+    # Returns the header and per slot (header, payload) numpy views straight onto the shared memory
+    header = np.ndarray(RING_HEADER_SIZE // 8, dtype=np.uint64, buffer=buffer)
+    slots = []
+    for index in range(slot_count):
+        offset = RING_HEADER_SIZE + index * slot_stride(slot_bytes)
+        slot_header = np.ndarray(SLOT_HEADER_SIZE // 8, dtype=np.uint64, buffer=buffer, offset=offset)
+        payload = np.ndarray(slot_bytes, dtype=np.uint8, buffer=buffer, offset=offset + SLOT_HEADER_SIZE)
+        slots.append((slot_header, payload))
+    return (header, slots)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Owned by another user, but still running
+        return True
+    return True
+
+
+def attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before 3.13 attaching registers the segment for cleanup, which would unlink it when the reader exits
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class ShmClient():
+    def __init__(self, name=DEFAULT_RING_NAME, slot_count=DEFAULT_SLOTS):
+        # The ring is sized from the first frame, so the sink needs no pixel count up front
+        self._name = name
+        self._slot_count = slot_count
+        self._shm = None
+        self._frames = 0
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._header[HEADER_STATE] = RING_CLOSED
+        self._header = None
+        self._slots = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def frames(self):
+        return self._frames
+
+    def send_frame(self, frame):
+        data = np.frombuffer(frame_buffer(frame), dtype=np.uint8)
+        if self._shm is None:
+            self._create(len(data))
+        if len(data) > self._slot_bytes:
+            raise ValueError("Frame of {} bytes does not fit the {} byte ring slots".format(len(data), self._slot_bytes))
+        timestamp_ns = frame.timestamp() if isinstance(frame, Frame) else time.time_ns()
+
+        # Seqlock, the slot sequence is odd while the payload is being written
+        sequence = self._frames
+        slot_header, payload = self._slots[sequence % self._slot_count]
+        slot_header[SLOT_SEQUENCE] = 2 * sequence + 1
+        payload[:len(data)] = data
+        slot_header[SLOT_LENGTH] = len(data)
+        slot_header[SLOT_TIMESTAMP] = timestamp_ns
+        slot_header[SLOT_SEQUENCE] = 2 * sequence + 2
+        self._header[HEADER_LATEST] = sequence + 1
+        self._frames += 1
+        return len(data)
+
+    def _create(self, slot_bytes):
+        size = ring_size(self._slot_count, slot_bytes)
+        try:
+            self._shm = shared_memory.SharedMemory(name=self._name, create=True, size=size)
+        except FileExistsError:
+            # A crashed sink leaves its ring open, so it is only refused while the process that wrote it is running
+            stale = attach_shared_memory(self._name)
+            pid = 0
+            if stale.size >= RING_HEADER_SIZE:
+                header = np.ndarray(RING_HEADER_SIZE // 8, dtype=np.uint64, buffer=stale.buf)
+                if header[HEADER_MAGIC] == RING_MAGIC and header[HEADER_STATE] == RING_OPEN:
+                    pid = int(header[HEADER_PID])
+                del header
+            stale.close()
+            if pid and process_alive(pid):
+                raise RuntimeError("Ring {} is in use by process {}".format(self._name, pid))
+            # Unlink through a tracked handle, the untracked one would leave the resource tracker unbalanced
+            stale = shared_memory.SharedMemory(name=self._name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=self._name, create=True, size=size)
+
+        self._slot_bytes = slot_bytes
+        self._header, self._slots = ring_views(self._shm.buf, self._slot_count, slot_bytes)
+        self._header[HEADER_SLOT_COUNT] = self._slot_count
+        self._header[HEADER_SLOT_BYTES] = slot_bytes
+        self._header[HEADER_LATEST] = 0
+        self._header[HEADER_PID] = os.getpid()
+        self._header[HEADER_STATE] = RING_OPEN
+        self._header[HEADER_MAGIC] = RING_MAGIC
+
+
+class ShmReader():
+    def __init__(self, name=DEFAULT_RING_NAME):
+        self._name = name
+        self._shm = None
+        self._header = None
+        self._slots = None
+        self._last = 0
+        self._frames = 0
+        self._dropped = 0
+        self._torn = 0
+
+    def __del__(self):
+        self.close()
+
+    def attach(self):
+        # Returns False until a sink has created the ring
+        if self._shm is not None:
+            return True
+        try:
+            shm = attach_shared_memory(self._name)
+        except FileNotFoundError:
+            return False
+
+        header = np.ndarray(RING_HEADER_SIZE // 8, dtype=np.uint64, buffer=shm.buf)
+        if header[HEADER_MAGIC] != RING_MAGIC or header[HEADER_STATE] != RING_OPEN:
+            del header
+            shm.close()
+            return False
+        slot_count, slot_bytes = int(header[HEADER_SLOT_COUNT]), int(header[HEADER_SLOT_BYTES])
+        del header
+
+        self._shm = shm
+        self._header, self._slots = ring_views(shm.buf, slot_count, slot_bytes)
+        # Start just behind the newest frame so it is shown straight away
+        self._last = max(int(self._header[HEADER_LATEST]) - 1, 0)
+        return True
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._header = None
+        self._slots = None
+        self._shm.close()
+        self._shm = None
+
+    def is_attached(self):
+        return self._shm is not None
+
+    def is_closed(self):
+        return self._shm is not None and self._header[HEADER_STATE] == RING_CLOSED
+
+    def slot_bytes(self):
+        return len(self._slots[0][1]) if self._slots else 0
+
+    def frames(self):
+        return self._frames
+
+    def dropped(self):
+        return self._dropped
+
+    def torn(self):
+        return self._torn
+
+    def read_latest(self, out):
+        # Copies the newest complete frame into out, returns (length, timestamp ns) or None if nothing new
+        if self._shm is None:
+            return None
+        for _ in range(READ_RETRIES):
+            latest = int(self._header[HEADER_LATEST])
+            if latest == self._last:
+                return None
+            sequence = latest - 1
+            expected = 2 * sequence + 2
+            slot_header, payload = self._slots[sequence % len(self._slots)]
+            if slot_header[SLOT_SEQUENCE] != expected:
+                continue
+            length = int(slot_header[SLOT_LENGTH])
+            if length > len(out):
+                raise ValueError("Ring frame of {} bytes does not fit in {} bytes".format(length, len(out)))
+            timestamp_ns = int(slot_header[SLOT_TIMESTAMP])
+            out[:length] = payload[:length]
+            # The writer lapped the ring while we copied, try again with whatever is newest now
+            if slot_header[SLOT_SEQUENCE] != expected:
+                self._torn += 1
+                continue
+
+            self._dropped += latest - self._last - 1
+            self._last = latest
+            self._frames += 1
+            return (length, timestamp_ns)
+        return None
@@ -3,6 +3,8 @@
 import os
 import socket
 
+from frame import frame_buffer
+
 class SimClient():
     def __init__(self, socket_path):
         self._socket_path = socket_path
@@ -16,5 +18,5 @@ class SimClient():
         self._socket.connect(self._socket_path)
 
     def send_frame(self, frame):
-        sent = self._socket.sendall(frame)
+        sent = self._socket.sendall(frame_buffer(frame))
         return sent
@@ -2,21 +2,27 @@
 
 import numpy as np
 import os
+import selectors
 import socket
 import sys
 import time
 import threading
 import signal
 from pprint import pprint
-from select import select
 
 import trimesh
 import pyrender
+from OpenGL.GL import GL_ARRAY_BUFFER, GL_BUFFER_SIZE, glBindBuffer, glBufferSubData, glGetBufferParameteriv
+
+from shm_client import DEFAULT_RING_NAME, ShmReader
 
 
 VIEWER = None
 SCENE = None
+TREE_SIM = None
 QUIT = threading.Lock()
+SOCKET_POLL_TIMEOUT = 0.1
+STATS_INTERVAL = 10
 
 
 
@@ -32,32 +38,83 @@ class TreeSim():
         self._scene = pyrender.Scene(ambient_light=[1, 1, 1], bg_color=[0, 0, 0, 0])
 
         # Compute the normalized location of all the pixels
-        self._points = [[pixel[0] / 1080, pixel[1] / 1080, pixel[2] / 1920] for index, pixel in self._pixel_map.items()]
+        self._points = np.array([pixel[:3] for pixel in self._pixel_map.values()], dtype=np.float32)
+        self._points /= np.array([1080, 1080, 1920], dtype=np.float32)
         self._poses = np.tile(np.eye(4), (self._pixel_count, 1, 1))
         self._poses[:,:3,3] = self._points
 
-        # Setup the mesh for each light
-        all_on = [[color[0], color[1], color[2]] for color in np.tile(np.ones(3), [self._pixel_count, 1])]
+        # Setup the mesh for each light, it is built once and only its colors change after that
+        all_on = np.ones((self._pixel_count, 3), dtype=np.float32)
         self._pixel_mesh = pyrender.Mesh.from_points(self._points, colors=all_on)
+        self._primitive = self._pixel_mesh.primitives[0]
 
-        pprint(self._pixel_mesh.primitives[0].mode)
+        pprint(self._primitive.mode)
 
         self._pixel_mesh_node = self._scene.add(self._pixel_mesh)
 
+        # Same interleaved position and RGBA layout pyrender uploads for a point primitive
+        self._vertex_data = np.ascontiguousarray(np.hstack((self._primitive.positions, self._primitive.color_0)), dtype=np.float32)
+        self._staged_colors = np.zeros((self._pixel_count, 3), dtype=np.float32)
+        self._pending_colors = np.zeros((self._pixel_count, 3), dtype=np.float32)
+        self._colors_dirty = False
+        self._color_lock = threading.Lock()
+        self._in_place = self._layout_matches()
+        self._buffer_checked = False
+
+    def _layout_matches(self):
+        # Colors are written straight into pyrender's vertex buffer through private attributes, as of the
+        # pyrender commit pinned in requirements.txt (a59963e). Anything else gets the mesh rebuilt every frame
+        primitive = self._primitive
+        if not hasattr(primitive, '_vaid') or not isinstance(getattr(primitive, '_buffers', None), list):
+            print("Unknown pyrender primitive internals, rebuilding the mesh every frame")
+            return False
+        extra = (primitive.normals, primitive.tangents, primitive.texcoord_0, primitive.texcoord_1)
+        if any(attribute is not None for attribute in extra) or \
+                primitive.color_0 is None or primitive.color_0.shape != (self._pixel_count, 4):
+            print("Unexpected pyrender vertex layout, rebuilding the mesh every frame")
+            return False
+        return True
 
     def update(self, frame):
         if len(frame) != (self._pixel_count * 3):
             return
 
-        # First calculate normalized colors and put them in a matrix
-        colors = []
-        for index in range(self._pixel_count):
-            byte_index = index * 3
-            red = frame[byte_index] / 255
-            green = frame[byte_index + 1] / 255
-            blue = frame[byte_index + 2] / 255
-            colors.append([red, green, blue])
+        # First calculate normalized colors, then swap them in for the viewer to upload
+        np.multiply(np.frombuffer(frame, dtype=np.uint8).reshape(-1, 3), np.float32(1 / 255), out=self._staged_colors)
+        if not self._in_place:
+            self._rebuild_mesh(self._staged_colors.copy())
+            return
+        with self._color_lock:
+            self._staged_colors, self._pending_colors = self._pending_colors, self._staged_colors
+            self._colors_dirty = True
 
+    def upload_colors(self):
+        # Called on the viewer thread with the GL context current
+        if not self._in_place or self._primitive._vaid is None or not self._primitive._buffers:
+            return
+        if not self._buffer_checked:
+            self._buffer_checked = True
+            glBindBuffer(GL_ARRAY_BUFFER, self._primitive._buffers[0])
+            buffer_size = glGetBufferParameteriv(GL_ARRAY_BUFFER, GL_BUFFER_SIZE)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            if buffer_size != self._vertex_data.nbytes:
+                print("pyrender vertex buffer is {} bytes, expected {}, rebuilding the mesh every frame".format(
+                    buffer_size, self._vertex_data.nbytes))
+                self._in_place = False
+                return
+
+        with self._color_lock:
+            if not self._colors_dirty:
+                return
+            self._vertex_data[:, 3:6] = self._pending_colors
+            self._colors_dirty = False
+
+        glBindBuffer(GL_ARRAY_BUFFER, self._primitive._buffers[0])
+        glBufferSubData(GL_ARRAY_BUFFER, 0, self._vertex_data.nbytes, self._vertex_data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def _rebuild_mesh(self, colors):
+        # The slow path, swap in a whole new mesh for pyrender to upload
         with VIEWER.render_lock:
             self._scene.remove_node(self._pixel_mesh_node)
             self._pixel_mesh = pyrender.Mesh.from_points(self._points, colors=colors)
@@ -67,58 +124,153 @@ class TreeSim():
         return self._scene
 
 
+class TreeSimViewer(pyrender.Viewer):
+    def __init__(self, tree_sim, scene, **kwargs):
+        self._tree_sim = tree_sim
+        super().__init__(scene, **kwargs)
+
+    def on_draw(self):
+        self._tree_sim.upload_colors()
+        super().on_draw()
+
+
 class FrameSocketConn():
-    def __init__(self, connection):
+    def __init__(self, connection, conn_id, frame_bytes):
         self._connection = connection
+        self._connection.setblocking(False)
+        self._conn_id = conn_id
         self._open = True
 
+        # Frames are reassembled in place, a complete one is swapped out and the buffer reused
+        self._receiving = bytearray(frame_bytes)
+        self._receiving_view = memoryview(self._receiving)
+        self._complete = bytearray(frame_bytes)
+        self._filled = 0
+        self._has_frame = False
+
+        self._frames = 0
+        self._dropped = 0
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+
     def __del__(self):
         self._connection.close()
 
+    def connection(self):
+        return self._connection
+
     def is_open(self):
         return self._open
 
-    def has_data(self):
-        if self._open == False:
-            return False
-        r, w, x = select([self._connection.fileno()], [], [], 0)
-        return self._connection.fileno() in r
-
-    def read_data(self, byte_count):
-        if self._open == False:
-            return ""
-        rx = self._connection.recv(byte_count)
-        if len(rx) < 1:
-            self._open = False
-            return ""
-        else:
-            return rx
+    def read_data(self):
+        # Drain whatever is buffered, returns True if at least one frame completed
+        completed = False
+        while self._open:
+            try:
+                received = self._connection.recv_into(self._receiving_view[self._filled:])
+            except BlockingIOError:
+                break
+            except OSError:
+                received = 0
+            if received == 0:
+                self._open = False
+                break
+
+            self._filled += received
+            if self._filled == len(self._receiving):
+                self._receiving, self._complete = self._complete, self._receiving
+                self._receiving_view = memoryview(self._receiving)
+                self._filled = 0
+                if self._has_frame:
+                    self._dropped += 1
+                self._has_frame = True
+                self._frames += 1
+                self._window_frames += 1
+                completed = True
+        return completed
+
+    def take_frame(self):
+        if not self._has_frame:
+            return None
+        self._has_frame = False
+        return self._complete
+
+    def discard_frame(self):
+        # Another connection has a newer frame, so this one will never be shown
+        if self._has_frame:
+            self._has_frame = False
+            self._dropped += 1
+
+    def stats(self):
+        # Frames per second since the last call, so each report covers its own interval
+        now = time.monotonic()
+        fps = self._window_frames / max(now - self._window_start, 1e-6)
+        self._window_start = now
+        self._window_frames = 0
+        return "Connection {}: {:.1f} fps, {} frames, {} superseded".format(self._conn_id, fps, self._frames, self._dropped)
 
 
 class FrameSocket():
-    def __init__(self, socket_path):
+    def __init__(self, socket_path, frame_bytes):
         self._socket_path = socket_path
+        self._frame_bytes = frame_bytes
         self._socket = socket.socket(socket.AF_UNIX)
         try:
             self._socket.bind(self._socket_path)
         except:
             os.remove(self._socket_path)
             self._socket.bind(self._socket_path)
+        self._selector = selectors.DefaultSelector()
+        self._connections = []
+        self._next_conn_id = 0
+        self._latest = None
 
     def __del__(self):
+        self._selector.close()
         self._socket.close()
         os.remove(self._socket_path)
 
     def listen(self):
         self._socket.listen()
+        self._socket.setblocking(False)
+        self._selector.register(self._socket, selectors.EVENT_READ)
 
-    def connection_waiting(self):
-        r, w, x = select([self._socket.fileno()], [], [], 0)
-        return self._socket.fileno() in r
+    def connections(self):
+        return self._connections
 
-    def accept_connection(self):
-        conn, remote = self._socket.accept()
-        return FrameSocketConn(conn)
+    def poll(self, timeout):
+        # Blocks until a socket is readable or the timeout passes, returns the newest complete frame if any
+        for key, _ in self._selector.select(timeout):
+            if key.data is None:
+                self._accept_connection()
+                continue
+
+            conn = key.data
+            if conn.read_data():
+                if self._latest is not None and self._latest is not conn:
+                    self._latest.discard_frame()
+                self._latest = conn
+            if not conn.is_open():
+                print("{}, closed".format(conn.stats()))
+                self._selector.unregister(conn.connection())
+                self._connections.remove(conn)
+
+        if self._latest is None:
+            return None
+        frame = self._latest.take_frame()
+        if not self._latest.is_open():
+            self._latest = None
+        return frame
+
+    def _accept_connection(self):
+        try:
+            connection, remote = self._socket.accept()
+        except BlockingIOError:
+            return
+        conn = FrameSocketConn(connection, self._next_conn_id, self._frame_bytes)
+        self._next_conn_id += 1
+        self._connections.append(conn)
+        self._selector.register(connection, selectors.EVENT_READ, conn)
 
 
 def load_pixel_map(pixel_map_path):
@@ -133,9 +285,26 @@ def load_pixel_map(pixel_map_path):
     return pixel_map
 
 
+def shm_update_loop(tree_sim, ring_name):
+    # Polls the shared memory ring, no syscalls unless the sink goes away and comes back
+    reader = ShmReader(ring_name)
+    frame = np.zeros(tree_sim._pixel_count * 3, dtype=np.uint8)
+    while QUIT.locked():
+        if reader.is_closed():
+            print("Ring closed after {} frames, {} skipped".format(reader.frames(), reader.dropped()))
+            reader.close()
+        received = reader.read_latest(frame) if reader.attach() else None
+        if received:
+            tree_sim.update(frame[:received[0]])
+        if not VIEWER.is_active:
+            return
+        time.sleep(0.016)
+
+
 def update_loop():
     global VIEWER
     global SCENE
+    global TREE_SIM
     global QUIT
 
     print('Update loop started')
@@ -145,13 +314,7 @@ def update_loop():
 
     pixel_map = load_pixel_map(pixel_map_path)
     tree_sim = TreeSim(pixel_map)
-    frame_socket = FrameSocket(socket_path)
-    frame_socket.listen()
-
-    expected_bytes = len(pixel_map) * 3
-    frame_socket_conns = []
-    closed_frame_socket_conns = []
-
+    TREE_SIM = tree_sim
     SCENE = tree_sim.scene()
 
     while VIEWER is None:
@@ -159,23 +322,27 @@ def update_loop():
             return
         time.sleep(0.1)
 
-    while QUIT.locked():
-        frame = b''
-        if frame_socket.connection_waiting():
-            frame_socket_conns.append(frame_socket.accept_connection())
-        for conn in frame_socket_conns:
-            while conn.has_data():
-                frame = conn.read_data(expected_bytes)
-            if not conn.is_open():
-                closed_frame_socket_conns.append(conn)
-        for closed_conn in closed_frame_socket_conns:
-            frame_socket_conns.remove(closed_conn)
-        closed_frame_socket_conns = []
+    # "shm" or "shm:<name>" reads the shared memory ring instead of the socket
+    if socket_path == 'shm' or socket_path.startswith('shm:'):
+        shm_update_loop(tree_sim, socket_path[4:] or DEFAULT_RING_NAME)
+        VIEWER.close_external()
+        return
+
+    frame_socket = FrameSocket(socket_path, len(pixel_map) * 3)
+    frame_socket.listen()
 
-        tree_sim.update(frame)
+    last_report = time.monotonic()
+    while QUIT.locked():
+        frame = frame_socket.poll(SOCKET_POLL_TIMEOUT)
+        if frame is not None:
+            tree_sim.update(frame)
         if not VIEWER.is_active:
             return
-        time.sleep(0.016)
+
+        if time.monotonic() - last_report > STATS_INTERVAL:
+            last_report = time.monotonic()
+            for conn in frame_socket.connections():
+                print(conn.stats())
 
     VIEWER.close_external()
 
@@ -196,7 +363,7 @@ def main():
 
     while SCENE is None and QUIT.locked():
         time.sleep(0.1)
-    VIEWER = pyrender.Viewer(SCENE, auto_start=False, point_size=10, use_raymond_lighting=True, light_intensity=3000000)
+    VIEWER = TreeSimViewer(TREE_SIM, SCENE, auto_start=False, point_size=10, use_raymond_lighting=True, light_intensity=3000000)
     pprint(VIEWER.render_flags)
     VIEWER.start()
     while VIEWER.is_active:
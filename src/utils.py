@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
 import math
+import os
 import numpy as np
 
+DEFAULT_PIXEL_COUNT = 1000
+
+def env_pixel_count():
+    return int(os.getenv('PIXEL_COUNT', DEFAULT_PIXEL_COUNT))
+
 
 def calc_affine(rot_x, rot_y, rot_z):
     base_x = np.eye(4)
@@ -89,6 +95,47 @@ def hsl_to_rgb(hue, saturation, lightness):
     return (r, g, b)
 
 
+# Which of (chroma, x, 0) feeds r, g and b for each 60 degree hue sector
+HUE_SECTOR_ORDER = np.array([
+    [0, 1, 2],
+    [1, 0, 2],
+    [2, 0, 1],
+    [2, 1, 0],
+    [1, 2, 0],
+    [0, 2, 1],
+])
+
+def hsl_to_rgb_array(hue, saturation, lightness):
+    hue = np.asarray(hue, dtype=np.float32)
+    saturation = np.asarray(saturation, dtype=np.float32)
+    lightness = np.asarray(lightness, dtype=np.float32)
+    chroma = lightness * saturation
+    hue_prime = np.mod(hue / 60.0, 6.0)
+    x = chroma * (1.0 - np.abs(np.mod(hue_prime, 2.0) - 1.0))
+    m = lightness - chroma
+
+    chroma, x, m = np.broadcast_arrays(chroma, x, m)
+    components = np.stack([chroma, x, np.zeros_like(chroma)], axis=-1)
+    hue_index = np.minimum(hue_prime.astype(np.intp), 5)
+    rgb = np.take_along_axis(components, HUE_SECTOR_ORDER[hue_index], axis=-1)
+    rgb += m[..., np.newaxis]
+
+    return np.clip(rgb * 255, 0, 255).astype(np.uint8)
+
+
+class HueLUT():
+    def __init__(self, steps=3600, saturation=1.0, lightness=1.0):
+        # Precompute colors around the wheel so lookups are a single gather
+        self._steps = steps
+        self._scale = steps / 360.0
+        self._table = hsl_to_rgb_array(np.arange(steps) / self._scale, saturation, lightness)
+
+    def lookup(self, hue, out=None):
+        indices = np.asarray(hue) * self._scale
+        indices = np.mod(indices.astype(np.intp), self._steps)
+        return np.take(self._table, indices, axis=0, out=out)
+
+
 class Pixel():
     def __init__(self, index, x, y, z):
         self._index = index
@@ -120,18 +167,66 @@ class PixelMapIter():
         else:
             raise StopIteration
 
+class PixelGeometry():
+    def __init__(self, pixel_map):
+        self._coords = pixel_map.coords()
+        self._cache = {}
+
+    def _cached(self, name, compute):
+        # Everything is derived from fixed coordinates, so compute each value at most once
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    def bounds(self):
+        return self._cached('bounds', lambda: (self._coords.min(axis=0), self._coords.max(axis=0)))
+
+    def centroid(self):
+        return self._cached('centroid', lambda: self._coords.mean(axis=0))
+
+    def normalized(self):
+        def compute():
+            bounds_min, bounds_max = self.bounds()
+            extents = np.where(bounds_max > bounds_min, bounds_max - bounds_min, 1.0)
+            return (self._coords - bounds_min) / extents
+        return self._cached('normalized', compute)
+
+    def cylindrical(self):
+        # (radius, angle, height) about the z axis through the origin
+        def compute():
+            x, y, z = self._coords.T
+            return (np.hypot(x, y), np.arctan2(y, x), z.copy())
+        return self._cached('cylindrical', compute)
+
+    def spherical(self):
+        # (radius, azimuth, polar angle from +z) about the origin
+        def compute():
+            x, y, z = self._coords.T
+            radius = np.sqrt(x * x + y * y + z * z)
+            polar = np.arccos(np.clip(z / np.where(radius > 0, radius, 1.0), -1.0, 1.0))
+            return (radius, np.arctan2(y, x), polar)
+        return self._cached('spherical', compute)
+
+
 class PixelMap():
     def __init__(self, pixel_dict):
-        self._map = pixel_dict
-        self._pixel_map = {}
-        self._pixel_count = len(self._map)
-        self._pixel_mat = []
-        for index, pixel in self._map.items():
-            self._pixel_map[index] = Pixel(index, pixel[0], pixel[1], pixel[2])
-            self._pixel_mat.append([pixel[0], pixel[1], pixel[2], 1])
+        # Pixels are stored as homogeneous coordinates, one row per pixel index
+        self._pixel_count = len(pixel_dict)
+        self._pixel_mat = np.ones((self._pixel_count, 4), dtype=np.float32)
+        for index, pixel in pixel_dict.items():
+            self._pixel_mat[index, :3] = pixel[:3]
+        self._geometry = None
 
     def __iter__(self):
-        return PixelMapIter(self._pixel_map)
+        return PixelMapIter(self)
+
+    def __len__(self):
+        return self._pixel_count
+
+    def __getitem__(self, index):
+        # Pixel objects are only built when something asks for one
+        x, y, z = self._pixel_mat[index, :3].tolist()
+        return Pixel(index, x, y, z)
 
     @classmethod
     def from_csv(cls, pixel_map_csv):
@@ -149,6 +244,14 @@ class PixelMap():
                 pixel_dict[index] = (x, y, z)
         return PixelMap(pixel_dict)
 
+    @classmethod
+    def from_mat(cls, pixel_mat):
+        # Wrap an existing (N, 4) float32 matrix without copying it
+        pixel_map = cls.__new__(cls)
+        pixel_map._pixel_count = len(pixel_mat)
+        pixel_map._pixel_mat = pixel_mat
+        pixel_map._geometry = None
+        return pixel_map
 
     def count(self):
         return self._pixel_count
@@ -156,11 +259,16 @@ class PixelMap():
     def mat(self):
         return self._pixel_mat
 
-    def transform(self, transform_mat):
-        new_pixel_dict = {}
-        for index, coord in enumerate(self._pixel_mat):
-            x, y, z, dc =  np.matmul(transform_mat, coord)
-            new_pixel_dict[index] = (x, y, z)
-
-        return PixelMap(new_pixel_dict)
-
+    def coords(self):
+        return self._pixel_mat[:, :3]
+
+    def geometry(self):
+        # Built lazily and shared by every effect holding this map
+        if self._geometry is None:
+            self._geometry = PixelGeometry(self)
+        return self._geometry
+
+    def transform(self, transform_mat, out=None):
+        # Row vectors, so apply the transpose of the affine in one batched matmul
+        transform_mat = np.ascontiguousarray(np.transpose(transform_mat), dtype=np.float32)
+        return PixelMap.from_mat(np.matmul(self._pixel_mat, transform_mat, out=out))